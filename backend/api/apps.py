@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from api import checks, signals  # noqa: F401
+        from api.metrics import install_query_wrapper
+
+        connection_created.connect(install_query_wrapper)
@@ -0,0 +1,136 @@
+"""
+Асинхронные версии самых горячих GET-эндпоинтов для запуска под ASGI.
+
+Подключаются через foodgram.urls_async (см. AsyncReadPathMiddleware) и
+отдают те же данные, что и синхронные вьюсеты, включая кеш ответов.
+Остальные методы тех же URL передаются синхронным вьюсетам.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.urls import resolve, reverse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.authentication import AsyncTokenAuthentication
+from api.cache import (
+    acache_key, cache_entry, cached_response, response_cache_enabled, stats
+)
+from api.conditional import (
+    not_modified, recipe_state, set_validators, validators
+)
+from api.serializers.recipes import RecipeSerializer
+from foodgram.db_router import primary_reads
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Recipe
+from recipes.short_links import recipe_ids
+
+authentication = AsyncTokenAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status,
+        content_type='application/json', headers=headers
+    )
+
+
+def read_path(async_view):
+    """
+    GET и HEAD обслуживает async_view (с токен-аутентификацией и ошибками
+    в формате DRF), остальные методы — синхронная вьюха из ROOT_URLCONF.
+    """
+    @csrf_exempt
+    @functools.wraps(async_view)
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+            return await sync_to_async(match.func)(
+                request, *match.args, **match.kwargs
+            )
+        drf_request = Request(request, authenticators=())
+        try:
+            drf_request.user = await authentication.aauthenticate(request)
+            return await async_view(drf_request, *args, **kwargs)
+        except Http404 as error:
+            return api_error(exceptions.NotFound(*error.args))
+        except exceptions.APIException as error:
+            return api_error(error)
+    return view
+
+
+def api_error(error):
+    headers = None
+    if isinstance(error, (
+        exceptions.AuthenticationFailed, exceptions.NotAuthenticated
+    )):
+        headers = {'WWW-Authenticate': authentication.authenticate_header(None)}
+    return json_response({'detail': error.detail}, error.status_code, headers)
+
+
+@read_path
+async def ingredient_list(request):
+    current = validators(request, (await ingredient_index.afingerprint(), None))
+    response = not_modified(request, *current)
+    if response is None:
+        name = request.query_params.get('name', '')
+        response = json_response(await ingredient_index.asearch(name))
+        set_validators(response, *current)
+    return response
+
+
+@read_path
+async def recipe_detail(request, pk):
+    if not response_cache_enabled():
+        return await _recipe_detail_miss(request, pk, None)
+    key = await acache_key(request)
+    entry = await cache.aget(key)
+    if entry is not None:
+        stats.record(hit=True)
+        return cached_response(request, entry, json_response)
+    stats.record(hit=False)
+    # Запись в кеш собирается по основной базе, как в cache_response.
+    with primary_reads():
+        return await _recipe_detail_miss(request, pk, key)
+
+
+async def _recipe_detail_miss(request, pk, key):
+    current = validators(request, await sync_to_async(recipe_state)(request, pk))
+    if current is not None:
+        response = not_modified(request, *current)
+        if response is not None:
+            if key is not None:
+                response['X-Cache'] = 'MISS'
+            return response
+    recipe = await aget_object_or_404(
+        Recipe.objects.with_user_flags(request.user).with_related(request.user),
+        pk=pk
+    )
+    # Сериализатор может дочитать данные или создать вариант картинки —
+    # это синхронный код, поэтому он выполняется в потоке.
+    data = await sync_to_async(
+        lambda: RecipeSerializer(recipe, context={'request': request}).data
+    )()
+    response = json_response(data)
+    if current is not None:
+        set_validators(response, *current)
+    if key is not None:
+        response['X-Cache'] = 'MISS'
+        await cache.aset(
+            key, cache_entry(data, response), settings.RESPONSE_CACHE_TIMEOUT
+        )
+    return response
+
+
+@read_path
+async def recipe_get_link(request, pk):
+    if not await recipe_ids.acontains(pk):
+        raise exceptions.NotFound()
+    short_path = reverse('recipes:short-link-redirect', kwargs={'recipe_id': pk})
+    return json_response({'short-link': request.build_absolute_uri(short_path)})
@@ -0,0 +1,179 @@
+"""
+Токен-аутентификация с кешем «ключ токена → Token с пользователем».
+
+Кеш — ограниченный LRU с TTL в памяти процесса, при TOKEN_CACHE_SHARED
+дополнительно — общий кеш Django. Каждая запись помнит версию своего
+пользователя; версию сдвигают сигналы (сохранение и удаление
+пользователя, удаление токена), поэтому смена пароля, деактивация,
+удаление и logout действуют сразу во всех процессах.
+
+Для этого версии должны лежать в общем кеше (Redis, Memcached, файлы).
+Если кеш Django по умолчанию живёт в памяти процесса (LocMem, Dummy),
+сдвиг версии не виден другим воркерам, поэтому кеш токенов отключается,
+а проверка api.W001 предупреждает об этом.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.translation import gettext as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.cache import bump_version, process_local_cache
+
+USER_VERSION_KEY = 'auth:user:{}:version'
+SHARED_TOKEN_KEY = 'auth:token:{}'
+
+
+class TokenCache:
+    """LRU с TTL; в записи — Token с пользователем и версия пользователя."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def enabled(self):
+        return settings.TOKEN_CACHE_SIZE > 0 and not process_local_cache()
+
+    def _local(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[:2]
+
+    def _remember(self, digest, token, version):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TTL
+        with self._lock:
+            self._entries[digest] = (token, version, expires)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _forget(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def _checked(self, digest, entry, version, local):
+        token, cached_version = entry
+        if version != cached_version:
+            self._forget(digest)
+            return None
+        if not local:
+            self._remember(digest, token, version)
+        # Копия: вьюхи меняют request.user, а запись делят параллельные запросы.
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token
+
+    def get(self, key):
+        """Token из кеша или None, если его нет, он устарел или отозван."""
+        digest = self._digest(key)
+        entry, local = self._local(digest), True
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry, local = cache.get(SHARED_TOKEN_KEY.format(digest)), False
+        if entry is None:
+            return None
+        version = cache.get(USER_VERSION_KEY.format(entry[0].user_id), 0)
+        return self._checked(digest, entry, version, local)
+
+    async def aget(self, key):
+        digest = self._digest(key)
+        entry, local = self._local(digest), True
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = await cache.aget(SHARED_TOKEN_KEY.format(digest))
+            local = False
+        if entry is None:
+            return None
+        version = await cache.aget(USER_VERSION_KEY.format(entry[0].user_id), 0)
+        return self._checked(digest, entry, version, local)
+
+    def version(self, user_id):
+        return cache.get(USER_VERSION_KEY.format(user_id), 0)
+
+    async def aversion(self, user_id):
+        return await cache.aget(USER_VERSION_KEY.format(user_id), 0)
+
+    def set(self, key, token, version):
+        """
+        Запоминает токен с версией пользователя, прочитанной сразу после
+        запроса к БД. Если пользователя изменили ровно между этими двумя
+        чтениями, устаревшая запись проживёт не дольше TOKEN_CACHE_TTL.
+        """
+        digest = self._digest(key)
+        self._remember(digest, token, version)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(
+                SHARED_TOKEN_KEY.format(digest), (token, version),
+                settings.TOKEN_CACHE_TTL
+            )
+
+    def invalidate_user(self, user_id):
+        """Отзывает закешированные токены пользователя во всех процессах."""
+        bump_version(USER_VERSION_KEY.format(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД, пока токен есть в token_cache."""
+
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled():
+            return super().authenticate_credentials(key)
+        token = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, token, token_cache.version(user.pk))
+        return user, token
+
+
+class AsyncTokenAuthentication(CachedTokenAuthentication):
+    """TokenAuthentication для асинхронных вьюх: токен читается async ORM."""
+
+    def authenticate_credentials(self, key):
+        # Синхронный authenticate() здесь только разбирает заголовок
+        # (с теми же ошибками, что и DRF), а токен ищет aauthenticate.
+        return key
+
+    async def aauthenticate(self, request):
+        key = self.authenticate(request)
+        if key is None:
+            return AnonymousUser()
+        cached = token_cache.enabled()
+        token = await token_cache.aget(key) if cached else None
+        if token is not None:
+            return token.user
+        try:
+            token = await self.get_model().objects.select_related(
+                'user'
+            ).aget(key=key)
+        except self.get_model().DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        if cached:
+            token_cache.set(
+                key, token, await token_cache.aversion(token.user_id)
+            )
+        return token.user
@@ -0,0 +1,153 @@
+"""
+Пакетное добавление и удаление избранного, корзины и подписок.
+
+Строки вставляются одним bulk_create и удаляются одним DELETE, поэтому
+сигналы моделей не срабатывают — счётчики, суммы корзины и версия кеша
+пользователя обновляются здесь же пачкой.
+
+Поиск существующих связей идёт в той же транзакции, что и запись, под
+SELECT ... FOR UPDATE: объекты-цели и удаляемые связи заблокированы, а
+параллельная вставка той же связи ждёт коммита (PostgreSQL при вставке
+берёт блокировку на строку, на которую ссылается внешний ключ). SQLite
+FOR UPDATE не поддерживает: если связь успели вставить между поиском и
+записью, пачка откатывается до точки сохранения и вставляется по одной
+строке. Поэтому побочные эффекты применяются ровно к вставленным и
+удалённым строкам.
+"""
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Sum
+
+from api.cache import bump_user_version
+from recipes.cart_totals import adjust_totals
+from recipes.counters import bulk_change_counters
+from recipes.models import Recipe, RecipeIngredient, ShoppingCart, Subscription
+from users.models import User
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+SELF = 'self_subscription'
+
+
+def _apply_side_effects(relation, user, rows, sign):
+    if not rows:
+        return
+    bulk_change_counters(relation, rows, sign)
+    if relation is ShoppingCart:
+        totals = RecipeIngredient.objects.filter(
+            recipe_id__in=[row.recipe_id for row in rows]
+        ).values_list('ingredient_id').annotate(total=Sum('amount')).order_by()
+        adjust_totals(
+            [user.id], {pk: sign * total for pk, total in totals}
+        )
+    bump_user_version(user.id)
+
+
+def _lookup(relation, user, ids, target_model, fk, excluded=()):
+    """
+    Найденные объекты и существующие связи {id объекта: id связи} — по
+    запросу на каждое. Вызывается внутри transaction.atomic: строки
+    блокируются до конца транзакции.
+    """
+    ids = list(dict.fromkeys(ids))
+    found = set(
+        target_model.objects.select_for_update().filter(
+            pk__in=ids
+        ).order_by('pk').values_list('pk', flat=True)
+    ) - set(excluded)
+    existing = dict(relation.objects.select_for_update().filter(
+        user=user, **{f'{fk}_id__in': found}
+    ).order_by('pk').values_list(f'{fk}_id', 'pk'))
+    return ids, found, existing
+
+
+def _delete(relation, pks):
+    """
+    Один DELETE по id без сигналов: побочные эффекты уже применены пачкой.
+    QuerySet.delete() при подписчиках на сигналы удаляет построчно.
+    """
+    connection = connections[router.db_for_write(relation)]
+    table = connection.ops.quote_name(relation._meta.db_table)
+    column = connection.ops.quote_name(relation._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {column} IN ({placeholders})', pks
+        )
+        return cursor.rowcount
+
+
+def _insert(relation, rows):
+    """Вставляет строки и возвращает те, что вставлены этим запросом."""
+    try:
+        with transaction.atomic():
+            relation.objects.bulk_create(rows)
+        return rows
+    except IntegrityError:
+        pass
+    # Параллельный запрос добавил часть связей: остальные — по одной.
+    inserted = []
+    for row in rows:
+        try:
+            with transaction.atomic():
+                relation.objects.bulk_create([row])
+        except IntegrityError:
+            continue
+        inserted.append(row)
+    return inserted
+
+
+def add(relation, user, ids, target_model=Recipe, fk='recipe', excluded=()):
+    """Добавляет связи; возвращает [{'id': ..., 'status': ...}] по ids."""
+    with transaction.atomic():
+        ids, found, existing = _lookup(
+            relation, user, ids, target_model, fk, excluded
+        )
+        rows = _insert(relation, [
+            relation(user=user, **{f'{fk}_id': pk})
+            for pk in sorted(found - existing.keys())
+        ])
+        _apply_side_effects(relation, user, rows, 1)
+    added = {getattr(row, f'{fk}_id') for row in rows}
+
+    def status(pk):
+        if pk in excluded:
+            return SELF
+        if pk not in found:
+            return NOT_FOUND
+        return ADDED if pk in added else ALREADY_ADDED
+    return [{'id': pk, 'status': status(pk)} for pk in ids]
+
+
+def remove(relation, user, ids, target_model=Recipe, fk='recipe'):
+    """Удаляет связи одним DELETE; статусы как у add."""
+    with transaction.atomic():
+        ids, found, existing = _lookup(relation, user, ids, target_model, fk)
+        rows = [
+            relation(pk=row_pk, user=user, **{f'{fk}_id': pk})
+            for pk, row_pk in existing.items()
+        ]
+        if rows:
+            # _apply_side_effects до DELETE: суммы корзины читают
+            # RecipeIngredient, а строки связей заблокированы.
+            _apply_side_effects(relation, user, rows, -1)
+            _delete(relation, [row.pk for row in rows])
+
+    def status(pk):
+        if pk not in found:
+            return NOT_FOUND
+        return REMOVED if pk in existing else NOT_ADDED
+    return [{'id': pk, 'status': status(pk)} for pk in ids]
+
+
+def add_subscriptions(user, ids):
+    return add(
+        Subscription, user, ids, target_model=User, fk='author',
+        excluded=(user.id,)
+    )
+
+
+def remove_subscriptions(user, ids):
+    return remove(Subscription, user, ids, target_model=User, fk='author')
@@ -0,0 +1,169 @@
+"""
+Кеш ответов API с версионированием по рецептам и пользователям.
+
+Версии сдвигаются в кеше Django, поэтому кеш ответов работает только
+с общим для воркеров CACHE_BACKEND. С кешем в памяти процесса (LocMem,
+Dummy) запись из одного воркера не сбросила бы ответы в других: ответы
+не кешируются, а проверка api.W003 предупреждает об этом.
+"""
+import functools
+import hashlib
+import threading
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram.db_router import primary_reads
+
+GLOBAL_VERSION_KEY = 'recipes:version'
+USER_VERSION_KEY = 'recipes:user:{}:version'
+RESPONSE_KEY = 'recipes:response:{}:{}:{}'
+# Вместе с данными хранятся валидаторы: на попадании в кеш 304 отдаётся
+# без запросов к БД.
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified', 'Vary')
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def process_local_cache():
+    """Кеш Django по умолчанию не виден другим процессам."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES)
+
+
+def response_cache_enabled():
+    return settings.RESPONSE_CACHE_TIMEOUT > 0 and not process_local_cache()
+
+
+class ResponseCacheStats:
+    """Счётчики попаданий и промахов кеша ответов в этом процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+stats = ResponseCacheStats()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def bump_version(key):
+    # Второй сдвиг после коммита не даёт закешировать ответ, собранный
+    # параллельным запросом по ещё не зафиксированным данным.
+    _incr(key)
+    transaction.on_commit(lambda: _incr(key))
+
+
+def bump_recipes_version():
+    """Инвалидирует закешированные ответы всех пользователей."""
+    bump_version(GLOBAL_VERSION_KEY)
+
+
+def bump_user_version(user_id):
+    """Инвалидирует закешированные ответы одного пользователя."""
+    bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def _version_keys(request):
+    user = request.user
+    user_key = USER_VERSION_KEY.format(user.pk) if user.is_authenticated else None
+    return user_key, [key for key in (GLOBAL_VERSION_KEY, user_key) if key]
+
+
+def _cache_key(request):
+    user_key, keys = _version_keys(request)
+    return _build_key(request, user_key, cache.get_many(keys))
+
+
+async def acache_key(request):
+    """Ключ кеша ответа для асинхронных вьюх."""
+    user_key, keys = _version_keys(request)
+    return _build_key(request, user_key, await cache.aget_many(keys))
+
+
+def _build_key(request, user_key, versions):
+    user = request.user
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(
+        versions.get(GLOBAL_VERSION_KEY, 0),
+        f'{user.pk}.{versions.get(user_key, 0)}' if user_key else 'anon',
+        digest,
+    )
+
+
+def cache_entry(data, response):
+    """Данные ответа и его валидаторы для записи в кеш."""
+    return data, {
+        name: response[name]
+        for name in VALIDATOR_HEADERS if response.has_header(name)
+    }
+
+
+def cached_response(request, entry, response_class=Response):
+    """Ответ из записи кеша: 304, если валидаторы клиента совпадают."""
+    data, headers = entry
+    response = response_class(data)
+    for name, value in headers.items():
+        response[name] = value
+    response = get_conditional_response(
+        request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+        response=response,
+    )
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cache_response(view_method):
+    """
+    Кеширует данные успешного ответа метода вьюсета.
+
+    Ключ учитывает путь, параметры запроса, глобальную версию рецептов
+    и версию текущего пользователя; ответ помечается заголовком X-Cache.
+    Промах собирается по основной базе: ответ с отставшей реплики
+    остался бы в кеше под новой версией до истечения таймаута.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not response_cache_enabled():
+            return view_method(self, request, *args, **kwargs)
+        key = _cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            stats.record(hit=True)
+            return cached_response(request, entry)
+        stats.record(hit=False)
+        with primary_reads():
+            response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, cache_entry(response.data, response), settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
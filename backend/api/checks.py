@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from api.cache import process_local_cache
+
+
+@register(Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    """Кеш токенов без общего кеша Django отключён — предупреждаем."""
+    if settings.TOKEN_CACHE_SIZE > 0 and process_local_cache():
+        return [Warning(
+            'Кеш токенов отключён: кеш Django по умолчанию живёт в памяти '
+            'процесса, и отзыв токена не дошёл бы до других воркеров.',
+            hint='Задайте общий CACHE_BACKEND (Redis, Memcached, файлы) или '
+                 'TOKEN_CACHE_SIZE=0, чтобы убрать предупреждение.',
+            id='api.W001',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_replica_routing(app_configs, **kwargs):
+    """Реплики без общего кеша Django не используются — предупреждаем."""
+    if settings.DATABASE_REPLICAS and process_local_cache():
+        return [Warning(
+            'Чтение с реплик отключено: отметка о недавней записи клиента '
+            'лежала бы в памяти одного воркера, и другие воркеры отдали бы '
+            'ему отставшие данные с реплики.',
+            hint='Задайте общий CACHE_BACKEND (Redis, Memcached, файлы).',
+            id='api.W002',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """Кеш ответов без общего кеша Django отключён — предупреждаем."""
+    if settings.RESPONSE_CACHE_TIMEOUT > 0 and process_local_cache():
+        return [Warning(
+            'Кеш ответов отключён: сдвиг версии после записи сбросил бы '
+            'ответы только в одном воркере, остальные отдавали бы '
+            'устаревшие данные до RESPONSE_CACHE_TIMEOUT.',
+            hint='Задайте общий CACHE_BACKEND (Redis, Memcached, файлы) или '
+                 'RESPONSE_CACHE_TIMEOUT=0, чтобы убрать предупреждение.',
+            id='api.W003',
+        )]
+    return []
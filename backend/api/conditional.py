@@ -0,0 +1,171 @@
+"""
+Условные GET-запросы: ETag и Last-Modified без сериализации ответа.
+
+Валидаторы считаются по дешёвым агрегатам — updated_at, числу строк и
+состоянию избранного, корзины и подписок пользователя, — поэтому на
+совпавший If-None-Match или If-Modified-Since API отвечает 304 одним-двумя
+запросами к БД. Last-Modified отдаётся только анонимам (у флагов
+пользователя нет даты изменения) и только для отдельных объектов: удаление
+строки не сдвигает max(updated_at) списка, так что списки проверяются
+лишь по ETag, в котором есть число строк. Вместе с кешем ответов (cache_response)
+валидаторы сохраняются в записи кеша и на попадании не пересчитываются.
+"""
+import functools
+import hashlib
+
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from api.pagination import RecipePagination
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+from users.models import User
+
+USER_RELATIONS = (Favorite, ShoppingCart, Subscription)
+
+
+def flags_state(user, relations=USER_RELATIONS):
+    """
+    Агрегаты «число и последний id» связей пользователя: меняются при
+    любом добавлении или удалении рецепта в избранном, корзине или
+    подписки. Это некоррелированные подзапросы, поэтому их можно добавить
+    в aggregate() по любой выборке и обойтись одним запросом.
+    """
+    if not user.is_authenticated:
+        return {}
+    aggregates = {}
+    for model in relations:
+        rows = model.objects.filter(user=user).order_by().values('user')
+        name = model._meta.model_name
+        for suffix, function in (('count', Count), ('last', Max)):
+            aggregates[f'{name}_{suffix}'] = Max(Subquery(
+                rows.annotate(value=function('id')).values('value')
+            ))
+    return aggregates
+
+
+def _subscribed(user, author_ref):
+    if not user.is_authenticated:
+        return Value(False)
+    return Exists(Subscription.objects.filter(user=user, author=author_ref))
+
+
+def _first(queryset):
+    # Нечисловой pk из URL: 404 вернёт сама вьюха.
+    try:
+        return queryset.first()
+    except (TypeError, ValueError):
+        return None
+
+
+def recipe_state(request, pk):
+    """Рецепт: его updated_at, профиль автора и флаги текущего пользователя."""
+    user = request.user
+    row = _first(Recipe.objects.filter(pk=pk).with_user_flags(user).annotate(
+        is_subscribed=_subscribed(user, OuterRef('author'))
+    ).values_list(
+        'updated_at', 'author__updated_at',
+        'is_favorited', 'is_in_shopping_cart', 'is_subscribed'
+    ))
+    if row is None:
+        return None
+    return row, max(row[:2])
+
+
+def recipe_list_state(request, queryset):
+    """Страница рецептов: число, последние изменения рецептов и авторов."""
+    if RecipePagination.cursor_query_param in request.query_params:
+        # Курсорная лента специально обходится без COUNT(*).
+        return None
+    totals = queryset.aggregate(
+        count=Count('id'),
+        updated=Max('updated_at'),
+        author_updated=Max('author__updated_at'),
+        **flags_state(request.user),
+    )
+    return tuple(totals.values()), None
+
+
+def user_state(request, pk):
+    """Профиль: updated_at пользователя и подписка на него."""
+    row = _first(User.objects.filter(pk=pk).annotate(
+        is_subscribed=_subscribed(request.user, OuterRef('pk'))
+    ).values_list('updated_at', 'is_subscribed'))
+    if row is None:
+        return None
+    return row, row[0]
+
+
+def user_list_state(request, queryset):
+    totals = queryset.aggregate(
+        count=Count('id'),
+        updated=Max('updated_at'),
+        **flags_state(request.user, relations=(Subscription,)),
+    )
+    return tuple(totals.values()), None
+
+
+def ingredient_list_state(request):
+    """Справочник ингредиентов: отпечаток индекса в памяти, без БД."""
+    return ingredient_index.fingerprint(), None
+
+
+def validators(request, state):
+    """
+    (etag, last_modified) по результату функции состояния или None,
+    если объекта нет и ответ должна собрать сама вьюха.
+    """
+    if state is None:
+        return None
+    state, last_modified = state
+    user = request.user
+    digest = hashlib.md5(
+        f'{request.get_full_path()}|{user.pk}|{state!r}'.encode()
+    ).hexdigest()
+    if user.is_authenticated or last_modified is None:
+        return quote_etag(digest), None
+    return quote_etag(digest), int(last_modified.timestamp())
+
+
+def not_modified(request, etag, last_modified):
+    """Ответ 304 (или 412), если у клиента актуальная версия, иначе None."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
+
+
+def conditional_response(state_func):
+    """
+    Добавляет ETag и Last-Modified к ответу метода вьюсета и отвечает 304,
+    не вызывая его, если версия клиента совпадает. state_func(view,
+    request, *args, **kwargs) возвращает (состояние, last_modified) или None.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            current = validators(
+                request, state_func(self, request, *args, **kwargs)
+            )
+            if current is None:
+                return view_method(self, request, *args, **kwargs)
+            response = not_modified(request, *current)
+            if response is not None:
+                return response
+            response = view_method(self, request, *args, **kwargs)
+            set_validators(response, *current)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,30 @@
+from drf_extra_fields.fields import Base64ImageField
+
+from recipes.images import IMAGE_SIZES, ORIGINAL, variant_url
+
+
+class ImageVariantField(Base64ImageField):
+    """
+    Base64-картинка, отдающая URL нужного варианта изображения.
+
+    Вариант берётся из `?image_size=`, затем из `image_size` в контексте
+    сериализатора (задаётся вьюхой), затем из `default_size` поля.
+    """
+
+    def __init__(self, *args, default_size=ORIGINAL, **kwargs):
+        self.default_size = default_size
+        super().__init__(*args, **kwargs)
+
+    def get_image_size(self):
+        request = self.context.get('request')
+        size = request and request.query_params.get('image_size')
+        if size in IMAGE_SIZES:
+            return size
+        return self.context.get('image_size', self.default_size)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = variant_url(value, self.get_image_size())
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from recipes.models import Recipe
+from recipes.search import search_recipes
 from users.models import User
 
 
@@ -8,10 +9,11 @@ class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'is_favorited', 'is_in_shopping_cart', 'search']
 
     def filter_favorited(self, queryset, name, value):
         """Фильтр по избранным рецептам."""
@@ -27,4 +29,8 @@ class RecipeFilter(filters.FilterSet):
             if self.request.user.is_authenticated:
                 return queryset.filter(in_shopping_cart__user=self.request.user)
             return queryset.none()
-        return queryset
\ No newline at end of file
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности."""
+        return search_recipes(queryset, value)
@@ -0,0 +1,206 @@
+"""
+Метрики запросов: время, SQL, сериализация и размер ответа.
+
+Агрегаты живут в памяти процесса (у каждого воркера свои) и отдаются
+в текстовом формате Prometheus эндпоинтом /api/_metrics.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from api.cache import stats as cache_stats
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+LABELS = ('view', 'action', 'method')
+
+
+class RequestMetrics:
+    """Замеры одного запроса; собираются обёрткой SQL и сериализаторами."""
+
+    __slots__ = (
+        'started', 'view', 'action', 'queries', 'db_time',
+        'slowest_sql', 'slowest_time', 'serializer_time', 'depth'
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = self.action = ''
+        self.queries = 0
+        self.db_time = self.serializer_time = self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка SQL, которая ставится на каждое соединение при подключении.
+    Замеры попадают в метрики текущего запроса через contextvar — в том
+    числе из потоков sync_to_async, где выполняется асинхронный ORM.
+    """
+    request_metrics = current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    return request_metrics(execute, sql, params, many, context)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self.series.items()
+            ]
+        for labels, counts, total, count in sorted(series):
+            base = format_labels(labels)
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {count}'
+            yield f'{self.name}_sum{{{base}}} {total}'
+            yield f'{self.name}_count{{{base}}} {count}'
+
+
+class CounterMetric:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f'{self.name}{{{format_labels(labels, self.labels)}}} {value}'
+
+
+def format_labels(values, names=LABELS):
+    return ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in zip(names, values)
+    )
+
+
+requests_total = CounterMetric(
+    'foodgram_requests_total', 'Обработанные запросы.',
+    LABELS + ('status',)
+)
+request_duration = Histogram(
+    'foodgram_request_duration_seconds', 'Полное время запроса.',
+    DURATION_BUCKETS
+)
+db_duration = Histogram(
+    'foodgram_db_duration_seconds', 'Время SQL за запрос.', DURATION_BUCKETS
+)
+db_queries = Histogram(
+    'foodgram_db_queries', 'Число SQL-запросов за запрос.', QUERY_BUCKETS
+)
+serializer_duration = Histogram(
+    'foodgram_serializer_duration_seconds', 'Время сериализации за запрос.',
+    DURATION_BUCKETS
+)
+response_size = Histogram(
+    'foodgram_response_size_bytes', 'Размер тела ответа.', SIZE_BUCKETS
+)
+METRICS = (
+    requests_total, request_duration, db_duration, db_queries,
+    serializer_duration, response_size,
+)
+
+
+def record(metrics, method, status_code, size, elapsed):
+    labels = (metrics.view, metrics.action, method)
+    requests_total.inc(labels + (status_code,))
+    request_duration.observe(labels, elapsed)
+    db_duration.observe(labels, metrics.db_time)
+    db_queries.observe(labels, metrics.queries)
+    serializer_duration.observe(labels, metrics.serializer_time)
+    if size is not None:
+        response_size.observe(labels, size)
+
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    cache = cache_stats.as_dict()
+    for kind in ('hits', 'misses'):
+        name = f'foodgram_response_cache_{kind}_total'
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {cache[kind]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MeasuredSerializerMixin:
+    """
+    Учитывает время to_representation в метриках текущего запроса.
+    Вложенные сериализаторы не считаются повторно.
+    """
+
+    def to_representation(self, instance):
+        metrics = current.get()
+        if metrics is None or metrics.depth:
+            return super().to_representation(instance)
+        metrics.depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.depth -= 1
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from api import metrics
+from api.cache import process_local_cache
+from foodgram import db_router
+
+logger = logging.getLogger('foodgram.requests')
+
+SLOW_SQL_LENGTH = 1000
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеряет каждый запрос: общее время, число и время SQL, время
+    сериализации и размер ответа. Добавляет заголовок Server-Timing,
+    пишет в лог медленные запросы и копит гистограммы для /api/_metrics.
+    Работает и под WSGI, и под ASGI без лишних переходов между потоками.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = settings.SLOW_REQUEST_THRESHOLD_MS / 1000
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        elapsed = time.perf_counter() - request_metrics.started
+        match = request.resolver_match
+        if match is not None:
+            view = getattr(match.func, 'cls', match.func)
+            request_metrics.view = getattr(view, '__name__', 'unknown')
+            actions = getattr(match.func, 'actions', None) or {}
+            request_metrics.action = actions.get(request.method.lower(), '')
+        size = None if response.streaming else len(response.content)
+        metrics.record(
+            request_metrics, request.method, response.status_code,
+            size, elapsed
+        )
+        response['Server-Timing'] = self.server_timing(request_metrics, elapsed)
+        if elapsed >= self.slow_threshold:
+            self.log_slow(request, response, request_metrics, elapsed)
+        return response
+
+    @staticmethod
+    def server_timing(request_metrics, elapsed):
+        return (
+            f'total;dur={elapsed * 1000:.1f}, '
+            f'db;dur={request_metrics.db_time * 1000:.1f};'
+            f'desc="{request_metrics.queries} queries", '
+            f'serializer;dur={request_metrics.serializer_time * 1000:.1f}'
+        )
+
+    @staticmethod
+    def log_slow(request, response, request_metrics, elapsed):
+        logger.warning(
+            'Медленный запрос %s %s (%s.%s) %d: %.0f мс, SQL: %d за %.0f мс; '
+            'самый долгий (%.0f мс): %s',
+            request.method, request.get_full_path(),
+            request_metrics.view, request_metrics.action,
+            response.status_code, elapsed * 1000,
+            request_metrics.queries, request_metrics.db_time * 1000,
+            request_metrics.slowest_time * 1000,
+            (request_metrics.slowest_sql or '')[:SLOW_SQL_LENGTH],
+        )
+
+
+class AsyncReadPathMiddleware:
+    """
+    Под ASGI направляет запросы в ASYNC_ROOT_URLCONF, где горячие
+    GET-эндпоинты обслуживают асинхронные вьюхи. Под WSGI ничего не делает.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if not iscoroutinefunction(self):
+            return self.get_response(request)
+        if settings.ASYNC_READ_VIEWS:
+            request.urlconf = settings.ASYNC_ROOT_URLCONF
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик (foodgram.db_router) для GET, HEAD и
+    OPTIONS. После небезопасного запроса клиент READ_YOUR_WRITES_SECONDS
+    секунд читает с основной базы и видит свою запись — например, только
+    что добавленный в избранное рецепт. Клиент определяется по заголовку
+    Authorization или cookie сессии, без обращения к БД.
+
+    Отметка о записи хранится в кеше Django и должна быть видна всем
+    воркерам. С кешем в памяти процесса (LocMem, Dummy) все запросы читают
+    с основной базы, а проверка api.W002 предупреждает об этом.
+    """
+
+    sync_capable = True
+    async_capable = True
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    RECENT_WRITE_KEY = 'db:recent-write:{}'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.client_key(request)
+        allowed = self.is_read(request) and self.replicas_enabled() and not (
+            key and cache.get(key)
+        )
+        token = db_router.replica_reads.set(allowed)
+        try:
+            return self.get_response(request)
+        finally:
+            db_router.replica_reads.reset(token)
+            if key and not self.is_read(request):
+                cache.set(key, True, settings.READ_YOUR_WRITES_SECONDS)
+
+    async def __acall__(self, request):
+        key = self.client_key(request)
+        allowed = self.is_read(request) and self.replicas_enabled() and not (
+            key and await cache.aget(key)
+        )
+        token = db_router.replica_reads.set(allowed)
+        try:
+            return await self.get_response(request)
+        finally:
+            db_router.replica_reads.reset(token)
+            if key and not self.is_read(request):
+                await cache.aset(key, True, settings.READ_YOUR_WRITES_SECONDS)
+
+    def is_read(self, request):
+        return request.method in self.SAFE_METHODS
+
+    @staticmethod
+    def replicas_enabled():
+        return bool(settings.DATABASE_REPLICAS) and not process_local_cache()
+
+    def client_key(self, request):
+        if not self.replicas_enabled():
+            return None
+        client = request.headers.get('Authorization') or request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME
+        )
+        if not client:
+            return None
+        return self.RECENT_WRITE_KEY.format(
+            hashlib.sha256(client.encode()).hexdigest()
+        )
@@ -1,4 +1,12 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -16,3 +24,110 @@ class CustomPagination(PageNumberPagination):
         if limit and limit.isdigit():
             return min(int(limit), self.max_page_size)
         return self.page_size
+
+
+class RecipePagination(CustomPagination):
+    """
+    Постраничная пагинация с опциональным режимом курсора.
+
+    Если в запросе есть `?cursor=` (в том числе пустой), страница выбирается
+    по ключу `(pub_date, id)` без COUNT(*) и OFFSET. Иначе работает
+    привычный контракт `page`/`limit`. Результаты поиска упорядочены по
+    релевантности, а не по ключу курсора, поэтому с `?search=` курсор
+    игнорируется и страницы выбираются по номеру.
+    """
+    cursor_query_param = 'cursor'
+    search_query_param = 'search'
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and not request.query_params.get(self.search_query_param)
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+                ).reverse()
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+                )
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results:
+            first, last = results[0], results[-1]
+            if has_more or reverse:
+                self.next_position = (last.pub_date, last.id)
+            if position is not None and (has_more or not reverse):
+                self.previous_position = (first.pub_date, first.id)
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            pub_date = parse_datetime(tokens['p'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (pub_date, pk), reverse
+
+    def encode_cursor(self, position, reverse):
+        pub_date, pk = position
+        tokens = {'p': pub_date.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            remove_query_param(self.base_url, self.page_query_param),
+            self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
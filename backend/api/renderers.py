@@ -0,0 +1,33 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Рендерер для потоковых ответов: тело формирует сама вьюха,
+    а рендерер нужен только для согласования формата (`?format=`).
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Ошибки (401, 404) приходят словарём — отдаём их как JSON.
+        if data is None or isinstance(data, (str, bytes)):
+            return data
+        return json.dumps(data, ensure_ascii=False)
+
+
+class PlainTextRenderer(PassthroughRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONFileRenderer(PassthroughRenderer):
+    media_type = 'application/json'
+    format = 'json'
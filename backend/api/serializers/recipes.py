@@ -1,18 +1,25 @@
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 
-from recipes.models import Recipe, Ingredient, RecipeIngredient
+from api.fields import ImageVariantField
+from api.metrics import MeasuredSerializerMixin
+
+from recipes.cart_totals import recipe_ingredients_changing
+from recipes.models import (
+    Recipe, Ingredient, RecipeIngredient, ShoppingListItem
+)
 from api.serializers.users import UserSerializer
 
+BULK_MAX_IDS = 100
+
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(read_only=True)
+class ShortRecipeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
+    image = ImageVariantField(read_only=True, default_size='thumbnail')
 
     class Meta:
         model = Recipe
@@ -29,15 +36,35 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
         read_only_fields = fields
 
+
+class ShoppingListItemSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+        read_only_fields = fields
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Тело пакетных запросов: {"ids": [1, 2, 3]}."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BULK_MAX_IDS
+    )
+
+
 class IngredientAmountSerializer(serializers.Serializer):
     id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(min_value=1)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = IngredientAmountSerializer(many=True, write_only=True)
-    image = Base64ImageField()
+    image = ImageVariantField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -51,15 +78,9 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['author'] = UserSerializer(instance.author, context=self.context).data
         representation['ingredients'] = RecipeIngredientReadSerializer(
             instance.recipe_ingredients.all(), many=True
         ).data
-        request = self.context.get('request')
-        representation['image'] = (
-            request.build_absolute_uri(instance.image.url)
-            if instance.image and request else None
-        )
         return representation
 
     def validate_ingredients(self, value):
@@ -77,10 +98,16 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
+        annotated = getattr(obj, 'is_favorited', None)
+        if annotated is not None:
+            return user.is_authenticated and annotated
         return user.is_authenticated and obj.favorited.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
+        annotated = getattr(obj, 'is_in_shopping_cart', None)
+        if annotated is not None:
+            return user.is_authenticated and annotated
         return user.is_authenticated and obj.in_shopping_cart.filter(user=user).exists()
 
     def create_ingredients(self, recipe, ingredients):
@@ -92,6 +119,34 @@ class RecipeSerializer(serializers.ModelSerializer):
             ) for item in ingredients
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Сводит состав рецепта к ingredients, меняя только отличающиеся
+        строки: при правке названия или описания RecipeIngredient не трогается.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredients.only('ingredient', 'amount')
+        }
+        added, changed = [], []
+        for item in ingredients:
+            row = current.pop(item['id'].id, None)
+            if row is None:
+                added.append(RecipeIngredient(
+                    recipe=recipe, ingredient=item['id'], amount=item['amount']
+                ))
+            elif row.amount != item['amount']:
+                row.amount = item['amount']
+                changed.append(row)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[row.pk for row in current.values()]
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
@@ -100,9 +155,9 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        super().update(instance, validated_data)
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
+        with recipe_ingredients_changing(instance):
+            super().update(instance, validated_data)
+            self.update_ingredients(instance, ingredients)
         return instance
 
     def validate(self, attrs):
@@ -3,10 +3,20 @@ from djoser.serializers import UserSerializer as DjoserUserSerializer
 from django.contrib.auth import get_user_model
 from recipes.models import Subscription
 
+from api.metrics import MeasuredSerializerMixin
+
 User = get_user_model()
 
 
-class UserSerializer(DjoserUserSerializer):
+def get_recipes_limit(request):
+    """Значение `?recipes_limit=` или None, если параметр не задан."""
+    recipes_limit = request.query_params.get('recipes_limit', '').strip()
+    if recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+class UserSerializer(MeasuredSerializerMixin, DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(DjoserUserSerializer.Meta):
@@ -26,12 +36,15 @@ class UserSerializer(DjoserUserSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
+        annotated = getattr(user, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         return Subscription.objects.filter(user=request.user, author=user).exists()
 
 
 class SubscriptionUserSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count', read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -45,8 +58,13 @@ class SubscriptionUserSerializer(UserSerializer):
     def get_recipes(self, user):
         from api.serializers.recipes import ShortRecipeSerializer
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = user.recipes.all()
-        if recipes_limit and recipes_limit.strip().isdigit():
-            recipes = recipes[:int(recipes_limit.strip())]
+        # Вьюха подгружает рецепты всех авторов страницы одним запросом.
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(user.id, [])
+        else:
+            recipes = user.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return ShortRecipeSerializer(recipes, many=True, context={'request': request}).data
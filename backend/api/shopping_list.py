@@ -0,0 +1,94 @@
+"""Потоковая выгрузка списка покупок в нескольких форматах."""
+import csv
+import json
+
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.models import Recipe, ShoppingListItem
+
+CHUNK_SIZE = 500
+
+
+def ingredient_totals(user):
+    """Суммарное количество каждого ингредиента в корзине пользователя."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        total=F('amount')
+    ).order_by('ingredient__name').iterator(chunk_size=CHUNK_SIZE)
+
+
+def cart_recipes(user):
+    """Рецепты корзины вместе с автором одним запросом."""
+    return Recipe.objects.filter(in_shopping_cart__user=user).values_list(
+        'name', 'author__username', 'author__first_name', 'author__last_name'
+    ).order_by('name').iterator(chunk_size=CHUNK_SIZE)
+
+
+def _author_name(username, first_name, last_name):
+    return f'{first_name} {last_name}'.strip() or username
+
+
+def render_txt(user):
+    yield (
+        f'Список покупок — '
+        f'{timezone.localtime().strftime("%d.%m.%Y %H:%M")}\n\n'
+    )
+    for i, item in enumerate(ingredient_totals(user), start=1):
+        name = item['ingredient__name'].capitalize()
+        unit = item['ingredient__measurement_unit']
+        yield f'{i}. {name} ({unit}) — {item["total"]}\n'
+    yield '\nРецепты в списке покупок:\n\n'
+    for name, *author in cart_recipes(user):
+        yield f'— {name} (автор: {_author_name(*author)})\n'
+
+
+class _Echo:
+    """Файловый объект для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(user):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in ingredient_totals(user):
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total'],
+        ))
+
+
+def _json_array(items):
+    for i, item in enumerate(items):
+        yield (',' if i else '') + json.dumps(item, ensure_ascii=False)
+
+
+def render_json(user):
+    yield '{"created": %s, "ingredients": [' % json.dumps(
+        timezone.localtime().isoformat()
+    )
+    yield from _json_array(
+        {
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total'],
+        }
+        for item in ingredient_totals(user)
+    )
+    yield '], "recipes": ['
+    yield from _json_array(
+        {'name': name, 'author': _author_name(*author)}
+        for name, *author in cart_recipes(user)
+    )
+    yield ']}'
+
+
+EXPORTERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.cache import bump_recipes_version, bump_user_version
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, Subscription
+)
+from users.models import User
+
+# Поля пользователя, которых нет в ответах рецептов. Их сохранение —
+# вход (update_last_login) или смена пароля — кеш ответов не сбрасывает.
+USER_FIELDS_NOT_IN_RESPONSES = frozenset({
+    'last_login', 'password',
+    'recipes_count', 'subscribers_count', 'subscriptions_count',
+})
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=User)
+def invalidate_recipe_responses(sender, update_fields=None, **kwargs):
+    """Изменение содержимого рецептов сбрасывает кеш всех пользователей."""
+    if update_fields and update_fields <= USER_FIELDS_NOT_IN_RESPONSES:
+        return
+    bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def invalidate_user_responses(sender, instance, **kwargs):
+    """Флаги избранного, корзины и подписок меняют ответы одного пользователя."""
+    bump_user_version(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=User)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    """
+    Смена пароля, деактивация, удаление пользователя и logout (удаление
+    токена) сразу отзывают закешированные токены.
+    """
+    token_cache.invalidate_user(
+        instance.user_id if sender is Token else instance.pk
+    )
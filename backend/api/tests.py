@@ -1,3 +1,1170 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from copy import copy
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import (
+    AsyncClient, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import bulk
+from api.authentication import TokenCache, token_cache
+from api.checks import (
+    check_replica_routing, check_response_cache, check_token_cache
+)
+from foodgram import db_router
+from recipes.ingredient_index import ingredient_index
+from recipes.short_links import recipe_ids
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, ShoppingListItem, Subscription
+)
+from users.models import User
+
+REPLICA = 'replica'
+# Общий кеш Django, как у нескольких воркеров: файлы видны всем процессам.
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(
+        tempfile.gettempdir(), f'foodgram-test-cache-{os.getpid()}'
+    ),
+}}
+
+
+class QueryBudgetTests(TestCase):
+    """Эндпоинты /api/recipes/ и /api/users/ укладываются в бюджет запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Reader', last_name='Test', password='pass12345'
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{i}@example.com', username=f'author{i}',
+                first_name='Author', last_name=str(i), password='pass12345'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_recipes(self, count):
+        for i in range(count):
+            author = self.authors[i % len(self.authors)]
+            recipe = Recipe.objects.create(
+                author=author, name=f'рецепт {Recipe.objects.count()}',
+                text='текст', cooking_time=10
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+                for ingredient in self.ingredients
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        for author in self.authors:
+            Subscription.objects.get_or_create(user=self.user, author=author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def assert_budget(self, url, budget, grow=None):
+        """
+        Проверяет бюджет и независимость числа запросов от объёма данных.
+        Бюджеты включают один запрос валидаторов ETag (api.conditional).
+        """
+        before = self.count_queries(url)
+        self.assertLessEqual(before, budget, url)
+        if grow:
+            grow()
+            self.assertEqual(self.count_queries(url), before, url)
+
+    def test_recipe_list_anonymous(self):
+        self.create_recipes(2)
+        self.assert_budget(
+            '/api/recipes/?limit=10', 5, lambda: self.create_recipes(6)
+        )
+
+    def test_recipe_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(2)
+        self.assert_budget(
+            '/api/recipes/?limit=10', 5, lambda: self.create_recipes(6)
+        )
+
+    def test_recipe_list_filtered(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(2)
+        self.assert_budget(
+            '/api/recipes/?is_favorited=1&is_in_shopping_cart=1&limit=10',
+            5, lambda: self.create_recipes(6)
+        )
+
+    def test_recipe_detail(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(1)
+        recipe = Recipe.objects.first()
+        self.assert_budget(f'/api/recipes/{recipe.id}/', 4)
+
+    def test_recipe_detail_flags(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(1)
+        recipe = Recipe.objects.first()
+        data = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertTrue(data['author']['is_subscribed'])
+        self.assertEqual(len(data['ingredients']), len(self.ingredients))
+
+    def test_user_list(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(1)
+        self.assert_budget(
+            '/api/users/?limit=10', 3,
+            lambda: User.objects.create_user(
+                email='late@example.com', username='late',
+                first_name='Late', last_name='User', password='pass12345'
+            )
+        )
+
+    def test_subscriptions(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(3)
+        url = '/api/users/subscriptions/?recipes_limit=2&limit=10'
+        self.assert_budget(url, 3, lambda: self.create_recipes(6))
+        data = self.client.get(url).json()
+        self.assertEqual(data['count'], len(self.authors))
+        for author in data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], 3)
+            latest = Recipe.objects.filter(author_id=author['id']).values_list(
+                'id', flat=True
+            )[:2]
+            self.assertEqual([r['id'] for r in author['recipes']], list(latest))
+
+    def test_user_detail_and_me(self):
+        self.client.force_authenticate(self.user)
+        self.assert_budget(f'/api/users/{self.authors[0].id}/', 2)
+        self.assert_budget('/api/users/me/', 2)
+
+
+class RecipeCursorPaginationTests(TestCase):
+    """Режим курсора для /api/recipes/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cursor@example.com', username='cursor',
+            first_name='Cursor', last_name='Test', password='pass12345'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'рецепт {i}',
+                text='текст', cooking_time=5
+            )
+            for i in range(7)
+        ]
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::2]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        return ids
+
+    def test_walks_feed_in_page_order(self):
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.walk('/api/recipes/?cursor=&limit=3'), expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=3').json()
+        second = self.client.get(first['next']).json()
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual(previous['results'], first['results'])
+
+    def test_respects_filters(self):
+        ids = self.walk('/api/recipes/?cursor=&limit=2&is_favorited=1')
+        self.assertCountEqual(ids, [recipe.id for recipe in self.recipes[::2]])
+
+    def test_skips_count_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/recipes/?cursor=&limit=3')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in ctx.captured_queries)
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_keeps_relevance_order(self):
+        Recipe.objects.create(
+            author=self.user, name='Борщ', text='борщ, борщ и борщ',
+            cooking_time=5
+        )
+        Recipe.objects.create(
+            author=self.user, name='Суп', text='почти борщ', cooking_time=5
+        )
+        page = self.client.get('/api/recipes/?search=борщ').json()
+        data = self.client.get('/api/recipes/?cursor=&search=борщ').json()
+        self.assertEqual(data, page)
+        self.assertEqual(
+            [item['name'] for item in data['results']], ['Борщ', 'Суп']
+        )
+
+    def test_page_number_contract_kept(self):
+        data = self.client.get('/api/recipes/?page=2&limit=3').json()
+        self.assertEqual(data['count'], len(self.recipes))
+        self.assertEqual(len(data['results']), 3)
+
+
+@override_settings(CACHES=SHARED_CACHES, RESPONSE_CACHE_TIMEOUT=300)
+class RecipeResponseCacheTests(TestCase):
+    """Версионированный кеш ответов списка и карточки рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cache@example.com', username='cache',
+            first_name='Cache', last_name='Test', password='pass12345'
+        )
+        cls.other = User.objects.create_user(
+            email='other@example.com', username='other',
+            first_name='Other', last_name='Test', password='pass12345'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.other, name='рецепт', text='текст', cooking_time=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_feed_served_from_cache(self):
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_query_params_are_part_of_key(self):
+        self.get('/api/recipes/?limit=1')
+        self.assertEqual(self.get('/api/recipes/?limit=2')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/recipes/?limit=1')['X-Cache'], 'HIT')
+
+    def test_recipe_change_invalidates(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.get(url)
+        self.recipe.name = 'новое название'
+        self.recipe.save()
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'новое название')
+
+    def test_user_flags_invalidate_only_that_user(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.force_authenticate(self.other)
+        self.get(url)
+        self.client.force_authenticate(self.user)
+        self.assertFalse(self.get(url).json()['is_favorited'])
+
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.json()['is_favorited'])
+
+        Subscription.objects.create(user=self.user, author=self.other)
+        self.assertTrue(self.get(url).json()['author']['is_subscribed'])
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }})
+    def test_disabled_with_process_local_cache(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        for _ in range(2):
+            self.assertNotIn('X-Cache', self.get(url))
+            self.assertNotIn('X-Cache', self.get('/api/recipes/'))
+            response = async_to_sync(AsyncClient().get)(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Cache', response)
+        self.assertEqual(
+            [warning.id for warning in check_response_cache(None)],
+            ['api.W003']
+        )
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+            self.assertEqual(check_response_cache(None), [])
+
+    def test_login_keeps_cache(self):
+        self.get('/api/recipes/')
+        response = self.client.post('/api/auth/token/login/', {
+            'email': 'cache@example.com', 'password': 'pass12345'
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'HIT')
+
+        self.user.first_name = 'Новое имя'
+        self.user.save(update_fields=['first_name'])
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+
+
+class ShoppingListExportTests(TestCase):
+    """Потоковая выгрузка списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cart@example.com', username='cart',
+            first_name='Cart', last_name='Owner', password='pass12345'
+        )
+        cls.author = User.objects.create_user(
+            email='chef@example.com', username='chef',
+            first_name='Шеф', last_name='Повар', password='pass12345'
+        )
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'блюдо {i}',
+                text='текст', cooking_time=5
+            )
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=salt, amount=2)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=milk, amount=100)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, query='', queries=2):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                f'/api/recipes/download_shopping_cart/{query}'
+            )
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(ctx.captured_queries), queries)
+        return response, content
+
+    def test_txt_is_default(self):
+        response, content = self.download()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('shopping_list.txt', response['Content-Disposition'])
+        self.assertIn('1. Молоко (мл) — 300', content)
+        self.assertIn('2. Соль (г) — 6', content)
+        self.assertIn('— блюдо 0 (автор: Шеф Повар)', content)
+
+    def test_csv(self):
+        response, content = self.download('?format=csv', queries=1)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(content.splitlines()[1:], ['молоко,мл,300', 'соль,г,6'])
+
+    def test_json(self):
+        response, content = self.download('?format=json')
+        data = json.loads(content)
+        self.assertEqual(data['ingredients'][1], {
+            'name': 'соль', 'measurement_unit': 'г', 'amount': 6
+        })
+        self.assertEqual(len(data['recipes']), 3)
+
+    def test_anonymous_rejected(self):
+        response = APIClient().get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 401)
+
+
+class BulkRelationTests(TestCase):
+    """Пакетные эндпоинты избранного, корзины и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='bulk@example.com', username='bulk',
+            first_name='Bulk', last_name='User', password='pass12345'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'bulkauthor{i}@example.com', username=f'bulkauthor{i}',
+                first_name='Author', last_name=str(i), password='pass12345'
+            )
+            for i in range(3)
+        ]
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                author=cls.authors[0], name=f'пачка {i}',
+                text='текст', cooking_time=5
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=i + 1
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, ids, queries=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(
+                url, {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        if queries is not None:
+            self.assertLessEqual(len(ctx.captured_queries), queries)
+        return {row['id']: row['status'] for row in response.json()['results']}
+
+    def test_favorites(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ids = [recipe.id for recipe in self.recipes[:3]] + [999999]
+        self.assertEqual(self.send('post', '/api/recipes/favorite/', ids), {
+            self.recipes[0].id: 'already_added',
+            self.recipes[1].id: 'added',
+            self.recipes[2].id: 'added',
+            999999: 'not_found',
+        })
+        for recipe in self.recipes[:3]:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.favorites_count, 1)
+        statuses = self.send(
+            'delete', '/api/recipes/favorite/',
+            [self.recipes[1].id, self.recipes[4].id]
+        )
+        self.assertEqual(statuses, {
+            self.recipes[1].id: 'removed', self.recipes[4].id: 'not_added'
+        })
+        self.assertEqual(
+            set(Favorite.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )),
+            {self.recipes[0].id, self.recipes[2].id}
+        )
+        self.recipes[1].refresh_from_db()
+        self.assertEqual(self.recipes[1].favorites_count, 0)
+
+    def test_query_count_does_not_grow(self):
+        few = self.send(
+            'post', '/api/recipes/favorite/', [self.recipes[0].id], queries=10
+        )
+        self.assertEqual(len(few), 1)
+
+        def add_and_remove(ids):
+            with CaptureQueriesContext(connection) as ctx:
+                for method in ('post', 'delete'):
+                    getattr(self.client, method)(
+                        '/api/recipes/favorite/', {'ids': ids}, format='json'
+                    )
+            return len(ctx.captured_queries)
+
+        self.client.delete(
+            '/api/recipes/favorite/', {'ids': [self.recipes[0].id]},
+            format='json'
+        )
+        self.assertEqual(
+            add_and_remove([recipe.id for recipe in self.recipes]),
+            add_and_remove([self.recipes[0].id])
+        )
+
+    def test_shopping_cart_updates_totals(self):
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        self.send('post', '/api/recipes/shopping_cart/', ids)
+        item = ShoppingListItem.objects.get(user=self.user)
+        self.assertEqual(item.amount, 1 + 2 + 3)
+        self.send('delete', '/api/recipes/shopping_cart/', ids[:2])
+        item.refresh_from_db()
+        self.assertEqual(item.amount, 3)
+        summary = self.client.get('/api/recipes/shopping_cart/').json()
+        self.assertEqual(summary['recipes_count'], 1)
+
+    def test_subscriptions(self):
+        ids = [author.id for author in self.authors[:2]] + [self.user.id]
+        self.assertEqual(self.send('post', '/api/users/subscribe/', ids), {
+            self.authors[0].id: 'added',
+            self.authors[1].id: 'added',
+            self.user.id: 'self_subscription',
+        })
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscriptions_count, 2)
+        self.send('delete', '/api/users/subscribe/', ids[:1])
+        self.user.refresh_from_db()
+        self.authors[0].refresh_from_db()
+        self.assertEqual(self.user.subscriptions_count, 1)
+        self.assertEqual(self.authors[0].subscribers_count, 0)
+
+    def test_invalidates_cached_flags(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        self.assertFalse(self.client.get(url).json()['is_favorited'])
+        self.send('post', '/api/recipes/favorite/', [self.recipes[0].id])
+        self.assertTrue(self.client.get(url).json()['is_favorited'])
+
+    def test_concurrent_insert_is_not_counted_twice(self):
+        raced, other = self.recipes[:2]
+        lookup = bulk._lookup
+
+        def racing(*args, **kwargs):
+            # Параллельный запрос успел добавить ту же связь после поиска.
+            result = lookup(*args, **kwargs)
+            Favorite.objects.create(user=self.user, recipe=raced)
+            return result
+
+        with mock.patch('api.bulk._lookup', racing):
+            result = bulk.add(Favorite, self.user, [raced.id, other.id])
+        self.assertEqual(result, [
+            {'id': raced.id, 'status': bulk.ALREADY_ADDED},
+            {'id': other.id, 'status': bulk.ADDED},
+        ])
+        for recipe in (raced, other):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_payload(self):
+        for payload in ({}, {'ids': []}, {'ids': ['x']}):
+            response = self.client.post(
+                '/api/recipes/favorite/', payload, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+        response = APIClient().post(
+            '/api/recipes/favorite/', {'ids': [1]}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class RequestMetricsTests(TestCase):
+    """Server-Timing, лог медленных запросов и эндпоинт /api/_metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='metrics@example.com', username='metrics',
+            first_name='Metrics', last_name='User', password='pass12345'
+        )
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', username='staff', is_staff=True,
+            first_name='Staff', last_name='User', password='pass12345'
+        )
+        Recipe.objects.create(
+            author=cls.user, name='метрика', text='текст', cooking_time=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/recipes/')
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn('serializer;dur=', timing)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_logged_with_sql(self):
+        with self.assertLogs('foodgram.requests', 'WARNING') as logs:
+            APIClient().get('/api/recipes/')
+        self.assertIn('RecipeViewSet.list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 401)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+
+    def test_metrics_exposition(self):
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        labels = 'view="RecipeViewSet",action="list",method="GET"'
+        self.assertIn(
+            f'foodgram_request_duration_seconds_bucket{{{labels},le="+Inf"}}',
+            body
+        )
+        self.assertIn(f'foodgram_db_queries_count{{{labels}}}', body)
+        self.assertIn(f'foodgram_requests_total{{{labels},status="200"}}', body)
+        self.assertIn('foodgram_response_cache_misses_total', body)
+
+
+@override_settings(CACHES=SHARED_CACHES, RESPONSE_CACHE_TIMEOUT=300)
+class AsyncReadPathTests(TestCase):
+    """Асинхронные GET-эндпоинты под ASGI отвечают так же, как синхронные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='async@example.com', username='async',
+            first_name='Async', last_name='User', password='pass12345'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        Ingredient.objects.create(name='сахар', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='асинхронный суп', text='текст',
+            cooking_time=15
+        )
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=salt, amount=3)
+        Favorite.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def auth(self, key=None):
+        return {'Authorization': f'Token {key or self.token.key}'}
+
+    async def assert_same(self, path, headers=None):
+        sync_response = await sync_to_async(APIClient().get)(
+            path, headers=headers
+        )
+        await sync_to_async(cache.clear)()
+        async_response = await AsyncClient().get(path, headers=headers)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        return async_response
+
+    async def test_same_responses(self):
+        recipe = self.recipe.id
+        for path in (
+            '/api/ingredients/?name=са',
+            '/api/ingredients/',
+            f'/api/recipes/{recipe}/',
+            f'/api/recipes/{recipe}/get-link/',
+            '/api/recipes/999999/',
+            '/api/recipes/999999/get-link/',
+        ):
+            with self.subTest(path=path):
+                await self.assert_same(path)
+        response = await self.assert_same(f'/api/recipes/{recipe}/', self.auth())
+        self.assertTrue(response.json()['is_favorited'])
+
+    async def test_invalid_token(self):
+        response = await self.assert_same(
+            f'/api/recipes/{self.recipe.id}/', self.auth('bad')
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    async def test_async_views_used(self):
+        with mock.patch.object(
+            ingredient_index, 'asearch', wraps=ingredient_index.asearch
+        ) as asearch:
+            await AsyncClient().get('/api/ingredients/?name=со')
+        asearch.assert_called_once_with('со')
+        with override_settings(ASYNC_READ_VIEWS=False), mock.patch.object(
+            ingredient_index, 'asearch'
+        ) as asearch:
+            response = await AsyncClient().get('/api/ingredients/?name=со')
+        asearch.assert_not_called()
+        self.assertEqual(response.json()[0]['name'], 'соль')
+
+    async def test_detail_cached_between_paths(self):
+        path = f'/api/recipes/{self.recipe.id}/'
+        first = await AsyncClient().get(path)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = await sync_to_async(APIClient().get)(path)
+        self.assertEqual(second['X-Cache'], 'HIT')
+
+    async def test_conditional_get(self):
+        for path in (f'/api/recipes/{self.recipe.id}/', '/api/ingredients/'):
+            with self.subTest(path=path):
+                etag = (await sync_to_async(APIClient().get)(path))['ETag']
+                for _ in range(2):
+                    # Попадание в кеш ответов, затем промах.
+                    response = await AsyncClient().get(
+                        path, headers={'If-None-Match': etag}
+                    )
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response['ETag'], etag)
+                    await sync_to_async(cache.clear)()
+
+    async def test_other_methods_use_sync_views(self):
+        response = await AsyncClient().patch(
+            f'/api/recipes/{self.recipe.id}/', {'name': 'новое имя'},
+            content_type='application/json', headers=self.auth()
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+        response = await AsyncClient().delete(
+            f'/api/recipes/{self.recipe.id}/', headers=self.auth()
+        )
+        self.assertEqual(response.status_code, 204)
+
+    async def test_short_link(self):
+        response = await AsyncClient().get(f'/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'/recipes/{self.recipe.id}/')
+        response = await AsyncClient().get('/999999/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=SHARED_CACHES, RESPONSE_CACHE_TIMEOUT=300)
+class ConditionalRequestTests(TestCase):
+    """ETag и Last-Modified: 304 без сериализации ответа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='etag@example.com', username='etag',
+            first_name='Etag', last_name='User', password='pass12345'
+        )
+        cls.author = User.objects.create_user(
+            email='etag-author@example.com', username='etag-author',
+            first_name='Author', last_name='User', password='pass12345'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.pepper = Ingredient.objects.create(name='перец', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='суп', text='текст', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.salt, amount=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def revalidate(self, url, etag, status=304):
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status, url)
+        return response
+
+    def test_not_modified_on_cache_hit_without_queries(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.revalidate(url, etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_not_modified_on_cache_miss_with_one_query(self):
+        self.client.force_authenticate(self.user)
+        for url in (
+            f'/api/recipes/{self.recipe.id}/', '/api/recipes/',
+            f'/api/users/{self.author.id}/', '/api/users/', '/api/users/me/',
+        ):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    self.revalidate(url, etag)
+                self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_recipe_change_updates_etag(self):
+        self.client.force_authenticate(self.author)
+        url = f'/api/recipes/{self.recipe.id}/'
+        etags = [self.client.get(url)['ETag'], self.client.get('/api/recipes/')['ETag']]
+        response = self.client.patch(url, {
+            'ingredients': [{'id': self.pepper.id, 'amount': 1}],
+            'name': 'суп', 'text': 'текст', 'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.revalidate(url, etags[0], status=200)
+        self.revalidate('/api/recipes/', etags[1], status=200)
+
+    def test_ingredient_rename_updates_recipe_etag(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        ingredients_etag = self.client.get('/api/ingredients/')['ETag']
+        self.salt.name = 'морская соль'
+        self.salt.save()
+        cache.clear()
+        self.revalidate(url, etag, status=200)
+        self.revalidate('/api/ingredients/', ingredients_etag, status=200)
+
+    def test_user_flags_are_part_of_etag(self):
+        self.client.force_authenticate(self.user)
+        urls = (
+            f'/api/recipes/{self.recipe.id}/', '/api/recipes/',
+            f'/api/users/{self.author.id}/',
+        )
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assertTrue(self.revalidate(url, etag, status=200).data)
+        self.client.force_authenticate(self.author)
+        self.revalidate(urls[0], etags[0], status=200)
+
+    def test_profile_change_updates_etag(self):
+        url = f'/api/users/{self.author.id}/'
+        etag = self.client.get(url)['ETag']
+        recipe_etag = self.client.get(f'/api/recipes/{self.recipe.id}/')['ETag']
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        cache.clear()
+        self.revalidate(url, etag, status=200)
+        self.revalidate(f'/api/recipes/{self.recipe.id}/', recipe_etag, status=200)
+
+    def test_last_modified_only_for_anonymous(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(
+            url, headers={'If-Modified-Since': last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('Authorization', response['Vary'])
+
+    def test_lists_without_last_modified(self):
+        other = Recipe.objects.create(
+            author=self.author, name='борщ', text='текст', cooking_time=10
+        )
+        last_modified = self.client.get(
+            f'/api/recipes/{self.recipe.id}/'
+        )['Last-Modified']
+        for url in ('/api/recipes/', '/api/users/'):
+            with self.subTest(url=url):
+                self.assertNotIn('Last-Modified', self.client.get(url))
+        other.delete()
+        cache.clear()
+        response = self.client.get(
+            '/api/recipes/', headers={'If-Modified-Since': last_modified}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_cursor_pages_skip_validators(self):
+        response = self.client.get('/api/recipes/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(CACHES=SHARED_CACHES, TOKEN_CACHE_SIZE=10000)
+class CachedTokenAuthenticationTests(TestCase):
+    """Кеш токенов: без запроса к БД и с немедленным отзывом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='token@example.com', username='token',
+            first_name='Token', last_name='User', password='pass12345'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.client = APIClient()
+
+    def get_me(self, token=None, status=200):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/users/me/', headers={
+                'Authorization': f'Token {(token or self.token).key}'
+            })
+        self.assertEqual(response.status_code, status, response.content)
+        return any('authtoken_token' in q['sql'] for q in ctx.captured_queries)
+
+    def test_second_request_skips_token_query(self):
+        self.assertTrue(self.get_me())
+        self.assertFalse(self.get_me())
+
+    def test_request_user_is_a_copy(self):
+        self.get_me()
+        first, second = token_cache.get(self.token.key), token_cache.get(self.token.key)
+        self.assertIsNot(first.user, second.user)
+        self.assertEqual(first.user, self.user)
+
+    def test_logout_revokes_token(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/', headers={
+            'Authorization': f'Token {self.token.key}'
+        })
+        self.assertEqual(response.status_code, 204)
+        self.get_me(status=401)
+
+    def test_set_password_invalidates_entry(self):
+        self.get_me()
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'pass12345', 'new_password': 'n3w-Passw0rd!'
+        }, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertTrue(self.get_me())
+
+    def test_cached_user_does_not_overwrite_counters(self):
+        self.get_me()
+        User.objects.filter(pk=self.user.pk).update(subscribers_count=7)
+        self.client.post('/api/users/set_password/', {
+            'current_password': 'pass12345', 'new_password': 'n3w-Passw0rd!'
+        }, headers={'Authorization': f'Token {self.token.key}'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscribers_count, 7)
+        self.assertTrue(self.user.check_password('n3w-Passw0rd!'))
+
+    def test_deactivation_and_deletion(self):
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        self.get_me(status=401)
+        other = User.objects.create_user(
+            email='gone@example.com', username='gone',
+            first_name='Gone', last_name='User', password='pass12345'
+        )
+        token = Token.objects.create(user=other)
+        self.get_me(token)
+        other.delete()
+        self.get_me(token, status=401)
+
+    def test_lru_and_ttl(self):
+        other = User.objects.create_user(
+            email='lru@example.com', username='lru',
+            first_name='Lru', last_name='User', password='pass12345'
+        )
+        token = Token.objects.create(user=other)
+        with override_settings(TOKEN_CACHE_SIZE=1):
+            self.get_me()
+            self.get_me(token)
+            self.assertTrue(self.get_me())
+        with mock.patch('api.authentication.time.monotonic', return_value=1e12):
+            self.assertTrue(self.get_me())
+
+    def test_revocation_reaches_other_process(self):
+        # Второй воркер: свой LRU, а кеш Django открыт в другом потоке.
+        worker = TokenCache()
+
+        def authenticate():
+            result = []
+            thread = threading.Thread(target=lambda: result.append(
+                worker.get(self.token.key)
+            ))
+            thread.start()
+            thread.join()
+            return result[0]
+
+        self.get_me()
+        worker.set(self.token.key, self.token, worker.version(self.user.pk))
+        self.assertIsNotNone(authenticate())
+        response = self.client.post('/api/auth/token/logout/', headers={
+            'Authorization': f'Token {self.token.key}'
+        })
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(authenticate())
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }})
+    def test_disabled_with_process_local_cache(self):
+        self.assertTrue(self.get_me())
+        self.assertTrue(self.get_me())
+        self.assertEqual(
+            [warning.id for warning in check_token_cache(None)], ['api.W001']
+        )
+        with override_settings(TOKEN_CACHE_SIZE=0):
+            self.assertEqual(check_token_cache(None), [])
+
+    @override_settings(TOKEN_CACHE_SHARED=True)
+    def test_shared_cache(self):
+        self.get_me()
+        token_cache.clear()
+        self.assertFalse(self.get_me())
+        token_cache.clear()
+        self.token.delete()
+        self.get_me(status=401)
+
+    async def test_async_views_share_cache(self):
+        path = '/api/ingredients/'
+        headers = {'Authorization': f'Token {self.token.key}'}
+        await sync_to_async(self.get_me)()
+        with mock.patch.object(Token.objects, 'select_related') as query:
+            response = await AsyncClient().get(path, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        query.assert_not_called()
+        self.user.is_active = False
+        await self.user.asave()
+        response = await AsyncClient().get(path, headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    CACHES=SHARED_CACHES, RESPONSE_CACHE_TIMEOUT=300,
+    DATABASE_REPLICAS=[REPLICA], READ_YOUR_WRITES_SECONDS=60
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Безопасные запросы читают с реплики, запись и свои чтения — с основной."""
+
+    # '__all__' раскрывается в setUpClass, уже после регистрации реплики:
+    # раннер и системные проверки про неё не знают.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика — отдельный файл SQLite. Псевдоним и тестовая база
+        # появляются только на время этих тестов, а не при импорте модуля.
+        # connections.settings — это и есть settings.DATABASES.
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': settings.DATABASES['default'],
+            REPLICA: {
+                **settings.DATABASES['default'],
+                'TEST': {'NAME': os.path.join(
+                    tempfile.gettempdir(),
+                    f'foodgram-test-replica-{os.getpid()}.sqlite3'
+                )},
+            },
+        })[REPLICA]
+        replica = connections[REPLICA]
+        old_name = replica.settings_dict['NAME']
+        replica.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        cls.addClassCleanup(cls.drop_replica, old_name)
+        super().setUpClass()
+
+    @classmethod
+    def drop_replica(cls, old_name):
+        connections[REPLICA].creation.destroy_test_db(old_name, verbosity=0)
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            email='replica@example.com', username='replica',
+            first_name='Replica', last_name='User', password='pass12345'
+        )
+        self.author = User.objects.create_user(
+            email='replica-author@example.com', username='replica-author',
+            first_name='Author', last_name='User', password='pass12345'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='с основной', text='текст', cooking_time=5
+        )
+        # «Репликация»: те же строки на реплике, без сигналов.
+        for obj in (self.user, self.author, self.recipe):
+            type(obj).objects.using(REPLICA).bulk_create([copy(obj)])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def detail(self, client=None):
+        response = (client or self.client).get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def author_profile(self, client=None):
+        response = (client or self.client).get(f'/api/users/{self.author.id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_safe_requests_read_from_replica(self):
+        User.objects.using(REPLICA).filter(pk=self.author.pk).update(
+            first_name='с реплики'
+        )
+        self.assertEqual(self.author_profile(APIClient())['first_name'], 'с реплики')
+        self.assertEqual(self.author_profile()['first_name'], 'с реплики')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }})
+    def test_process_local_cache_reads_primary(self):
+        # Отметку о записи в LocMem не увидели бы другие воркеры.
+        User.objects.using(REPLICA).filter(pk=self.author.pk).update(
+            first_name='с реплики'
+        )
+        self.assertEqual(self.author_profile()['first_name'], 'Author')
+        self.assertEqual(
+            [warning.id for warning in check_replica_routing(None)],
+            ['api.W002']
+        )
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_replica_routing(None), [])
+
+    def test_cached_responses_filled_from_primary(self):
+        Recipe.objects.using(REPLICA).filter(pk=self.recipe.pk).update(
+            name='с реплики'
+        )
+        # Отставшая реплика не попадает в кеш ответов и в ETag.
+        for client in (APIClient(), APIClient()):
+            self.assertEqual(self.detail(client)['name'], 'с основной')
+        response = APIClient().get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_indexes_built_from_primary(self):
+        ingredient = Ingredient.objects.create(
+            name='только на основной', measurement_unit='г'
+        )
+        token = db_router.replica_reads.set(True)
+        try:
+            ingredient_index.invalidate()
+            recipe_ids.invalidate()
+            self.assertEqual(
+                [row['id'] for row in ingredient_index.search('только')],
+                [ingredient.id]
+            )
+            self.assertTrue(recipe_ids.contains(self.recipe.id))
+        finally:
+            db_router.replica_reads.reset(token)
+
+    def test_read_your_writes(self):
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(Subscription.objects.using(REPLICA).exists())
+        self.assertTrue(self.author_profile()['is_subscribed'])
+
+    @override_settings(READ_YOUR_WRITES_SECONDS=0)
+    def test_without_stickiness_replica_lag_is_visible(self):
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertFalse(self.author_profile()['is_subscribed'])
+
+    def test_tokens_and_transactions_use_primary(self):
+        router = db_router.ReplicaRouter()
+        token = db_router.replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Recipe), REPLICA)
+            self.assertEqual(router.db_for_read(Token), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Recipe), 'default')
+        finally:
+            db_router.replica_reads.reset(token)
+        self.assertIsNone(router.db_for_read(Recipe))
+        # Токена на реплике нет, но аутентификация его находит.
+        self.assertFalse(Token.objects.using(REPLICA).exists())
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
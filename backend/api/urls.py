@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from api.views.recipes import RecipeViewSet, IngredientViewSet
+from api.views.metrics import MetricsView
 from api.views.users import UserViewSet
 
 router = DefaultRouter()
@@ -9,6 +10,7 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('users', UserViewSet, basename='users')
 
 urlpatterns = [
+    path('_metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -0,0 +1,18 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.metrics import render_prometheus
+from api.renderers import PlainTextRenderer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsView(APIView):
+    """Агрегированные метрики запросов процесса в формате Prometheus."""
+
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PlainTextRenderer]
+
+    def get(self, request):
+        return Response(render_prometheus(), content_type=CONTENT_TYPE)
@@ -1,31 +1,36 @@
-from django.http import FileResponse, Http404
-from django.db.models import Sum
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from datetime import datetime
 
 from django.contrib.auth import get_user_model
+from recipes.ingredient_index import ingredient_index
+from recipes.short_links import recipe_ids
 from recipes.models import (
     Recipe, Ingredient, ShoppingCart,
-    Favorite, RecipeIngredient
+    Favorite, ShoppingListItem
 )
 from api.serializers.recipes import (
-    RecipeSerializer, ShortRecipeSerializer,
-    IngredientSerializer
+    BulkIdsSerializer, RecipeSerializer, ShortRecipeSerializer,
+    IngredientSerializer, ShoppingListItemSerializer
 )
-from api.pagination import CustomPagination
+from api import bulk
+from api.cache import cache_response
+from api.conditional import (
+    conditional_response, ingredient_list_state, recipe_list_state,
+    recipe_state
+)
+from api.pagination import RecipePagination
+from api.renderers import CSVRenderer, JSONFileRenderer, PlainTextRenderer
+from api.shopping_list import EXPORTERS
 from api.filters import RecipeFilter
 from api.permissions import IsAuthorOrReadOnly
 
 
-import io
-
 User = get_user_model()
 
 
@@ -35,18 +40,20 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     pagination_class = None
 
-    def get_queryset(self):
-        name = self.request.query_params.get('name')
-        if name:
-            return self.queryset.filter(name__istartswith=name)
-        return self.queryset
+    @conditional_response(
+        lambda view, request: ingredient_list_state(request)
+    )
+    def list(self, request, *args, **kwargs):
+        # Поиск по префиксу обслуживается индексом в памяти, без БД.
+        name = request.query_params.get('name', '')
+        return Response(ingredient_index.search(name))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthorOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
@@ -60,26 +67,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return ShortRecipeSerializer
         return super().get_serializer_class()
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_size'] = 'thumbnail'
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @cache_response
+    @conditional_response(lambda view, request: recipe_list_state(
+        request, view.filter_queryset(Recipe.objects.all())
+    ))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    @conditional_response(
+        lambda view, request, pk: recipe_state(request, pk)
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_queryset(self):
+        # Фильтрация по author/is_favorited/is_in_shopping_cart — в RecipeFilter.
         queryset = super().get_queryset()
+        if self.action in ('favorite', 'shopping_cart'):
+            return queryset
         user = self.request.user
-        author = self.request.query_params.get('author')
-        is_favorited = self.request.query_params.get('is_favorited')
-        is_in_shopping_cart = self.request.query_params.get('is_in_shopping_cart')
-
-        if author:
-            queryset = queryset.filter(author__id=author)
-
-        if user.is_authenticated:
-            if is_favorited == '1':
-                queryset = queryset.filter(favorited__user=user)
-            if is_in_shopping_cart == '1':
-                queryset = queryset.filter(in_shopping_cart__user=user)
-
-        return queryset
+        return queryset.with_user_flags(user).with_related(user)
 
     def _handle_post_delete_action(self, request, recipe, model):
         label_map = {
@@ -121,44 +138,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, recipe, ShoppingCart
         )
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, JSONFileRenderer]
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_cart__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total=Sum('amount')).order_by('ingredient__name')
-
-
-        recipes = Recipe.objects.filter(in_shopping_cart__user=user)
-
-        lines = [f'Список покупок — {datetime.now().strftime("%d.%m.%Y %H:%M")}']
-        lines.append('')
-
-        for i, item in enumerate(ingredients, start=1):
-            name = item["ingredient__name"].capitalize()
-            unit = item["ingredient__measurement_unit"]
-            amount = item["total"]
-            lines.append(f"{i}. {name} ({unit}) — {amount}")
-
-        lines.append('\nРецепты в списке покупок:\n')
-        for recipe in recipes:
-            lines.append(f'— {recipe.name} (автор: {recipe.author.get_full_name() or recipe.author.username})')
-
-        content = '\n'.join(lines)
-        return FileResponse(
-            content,
-            as_attachment=True,
-            filename='shopping_list.txt'
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](request.user),
+            content_type=f'{renderer.media_type}; charset=utf-8'
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
+
+    @action(
+        detail=False, methods=['get'], url_path='shopping_cart',
+        url_name='shopping-cart-summary', permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_summary(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response({
+            'recipes_count': request.user.shoppingcart_set.count(),
+            'ingredients': ShoppingListItemSerializer(items, many=True).data,
+        })
+
+    @shopping_cart_summary.mapping.post
+    @shopping_cart_summary.mapping.delete
+    def shopping_cart_bulk(self, request):
+        return self._bulk_response(request, ShoppingCart)
+
+    @action(
+        detail=False, methods=['post', 'delete'], url_path='favorite',
+        url_name='favorite-bulk', permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self._bulk_response(request, Favorite)
+
+    def _bulk_response(self, request, relation):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = bulk.add if request.method == 'POST' else bulk.remove
+        return Response({
+            'results': change(
+                relation, request.user, serializer.validated_data['ids']
+            )
+        })
 
     @action(detail=True, methods=['get'], url_path='get-link', permission_classes=[AllowAny])
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+        # Короткая ссылка не требует запроса к БД: id проверяется по карте.
+        if not pk.isdigit() or not recipe_ids.contains(int(pk)):
+            raise NotFound()
 
-        short_path = reverse('recipes:short-link-redirect', kwargs={'recipe_id': pk})
+        short_path = reverse('recipes:short-link-redirect', kwargs={'recipe_id': int(pk)})
         full_url = request.build_absolute_uri(short_path)
 
         return Response({'short-link': full_url}, status=status.HTTP_200_OK)
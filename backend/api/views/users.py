@@ -6,20 +6,24 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from drf_extra_fields.fields import Base64ImageField
 from django.contrib.auth import get_user_model
-from django.db.models import Count
+from django.db.models import Value
 from django.core.files.base import ContentFile
 from djoser.serializers import UserCreateSerializer, SetPasswordSerializer
 
 import base64
+from collections import defaultdict
 
 
 from api.serializers.users import (
     UserSerializer,
-    SubscriptionUserSerializer
+    SubscriptionUserSerializer,
+    get_recipes_limit
 )
+from api import bulk
+from api.conditional import conditional_response, user_list_state, user_state
 from api.pagination import CustomPagination
-from recipes.models import Subscription
-from api.serializers.recipes import ShortRecipeSerializer
+from recipes.models import Recipe, Subscription
+from api.serializers.recipes import BulkIdsSerializer, ShortRecipeSerializer
 
 User = get_user_model()
 
@@ -36,7 +40,26 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserCreateSerializer
         return UserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_subscription_flag(self.request.user)
+        return queryset
+
+    @conditional_response(lambda view, request: user_list_state(
+        request, User.objects.all()
+    ))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(lambda view, request, pk: user_state(request, pk))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @conditional_response(
+        lambda view, request: user_state(request, request.user.pk)
+    )
     def me(self, request):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -53,7 +76,9 @@ class UserViewSet(viewsets.ModelViewSet):
             try:
                 field = Base64ImageField()
                 user.avatar = field.to_internal_value(avatar_data)
-                user.save()
+                # request.user может прийти из кеша токенов: сохраняем
+                # только своё поле, не перетирая счётчики.
+                user.save(update_fields=['avatar', 'updated_at'])
 
                 with user.avatar.open("rb") as f:
                     encoded = base64.b64encode(f.read()).decode('utf-8')
@@ -66,7 +91,9 @@ class UserViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Невалидный формат изображения'}, status=status.HTTP_400_BAD_REQUEST)
 
         elif request.method == 'DELETE':
-            user.avatar.delete(save=True)
+            # Файл может быть общим с другими пользователями — его удалит gc_media.
+            user.avatar = None
+            user.save(update_fields=['avatar', 'updated_at'])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
@@ -99,14 +126,37 @@ class UserViewSet(viewsets.ModelViewSet):
             status=400
         )
 
+    @action(
+        detail=False, methods=['post', 'delete'], url_path='subscribe',
+        url_name='subscribe-bulk', permission_classes=[IsAuthenticated]
+    )
+    def subscribe_bulk(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = (
+            bulk.add_subscriptions if request.method == 'POST'
+            else bulk.remove_subscriptions
+        )
+        return Response({
+            'results': change(request.user, serializer.validated_data['ids'])
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
         subscriptions = User.objects.filter(subscribers__user=user).annotate(
-            recipes_count=Count('recipes')
-        )
+            is_subscribed=Value(True)
+        ).order_by('username', 'id')
         page = self.paginate_queryset(subscriptions)
-        serializer = SubscriptionUserSerializer(page, many=True, context={'request': request})
+        recipes_by_author = defaultdict(list)
+        for recipe in Recipe.objects.latest_per_author(
+            [author.id for author in page], get_recipes_limit(request)
+        ):
+            recipes_by_author[recipe.author_id].append(recipe)
+        serializer = SubscriptionUserSerializer(page, many=True, context={
+            'request': request,
+            'recipes_by_author': recipes_by_author,
+        })
         return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
@@ -114,5 +164,5 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = SetPasswordSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         request.user.set_password(serializer.validated_data['new_password'])
-        request.user.save()
+        request.user.save(update_fields=['password'])
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -6,5 +6,10 @@ python manage.py migrate --noinput
 # Собираем статику
 python manage.py collectstatic --noinput
 
-# Запускаем сервер
-gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
+# Запускаем сервер: ASGI=true — асинхронный путь чтения под uvicorn
+if [ "$ASGI" = "true" ]; then
+    gunicorn foodgram.asgi:application -k uvicorn_worker.UvicornWorker \
+        --bind 0.0.0.0:8000
+else
+    gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000
+fi
@@ -0,0 +1,54 @@
+"""
+Маршрутизация запросов к БД между основной базой и репликами.
+
+Чтение уходит на случайную реплику из DATABASE_REPLICAS, только если его
+разрешил ReplicaRoutingMiddleware (безопасный метод и у клиента нет
+недавней записи) и на основной базе не открыта транзакция. Запись всегда
+идёт на основную базу. Токены и сессии читаются с основной базы: отставшая
+реплика не должна пускать по отозванному токену или терять вход.
+
+Всё, что переживает запрос, — записи кеша ответов и индексы в памяти
+процесса, — читается с основной базы (primary_reads или using('default')):
+отставшая реплика не должна попасть в кеш под уже новой версией.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+PRIMARY_ONLY_MODELS = frozenset({'authtoken.token', 'sessions.session'})
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут на основную базу."""
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not replica_reads.get():
+            return None
+        if (
+            model._meta.label_lower in PRIMARY_ONLY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них можно связывать.
+        return True
@@ -54,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.AsyncReadPathMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,6 +69,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Под ASGI горячие GET-эндпоинты обслуживаются асинхронными вьюхами.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'true').lower() == 'true'
+ASYNC_ROOT_URLCONF = 'foodgram.urls_async'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -87,23 +94,95 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
-#         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
-#         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
-#         'HOST': os.getenv('DB_HOST', 'localhost'),
-#         'PORT': os.getenv('DB_PORT', '5432'),
-#     }
-# }
-
-DATABASES = {
+# DB_ENGINE=postgresql включает PostgreSQL из docker-compose, по умолчанию
+# SQLite. CONN_MAX_AGE держит соединение между запросами, а
+# CONN_HEALTH_CHECKS проверяет его перед повторным использованием. Под ASGI
+# каждый запрос идёт в своём потоке и постоянные соединения не
+# переиспользуются, поэтому там по умолчанию 0 и лучше включить пул
+# DB_POOL (psycopg 3, только PostgreSQL; с пулом CONN_MAX_AGE всегда 0).
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+DB_POOL = os.getenv('DB_POOL', 'false').lower() == 'true'
+ASGI = os.getenv('ASGI', 'false').lower() == 'true'
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'OPTIONS': {},
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+DATABASES['default']['CONN_MAX_AGE'] = 0 if DB_POOL else int(
+    os.getenv('DB_CONN_MAX_AGE', 0 if ASGI else 60)
+)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Реплики только для чтения: DB_REPLICAS — через запятую хосты PostgreSQL
+# (остальные параметры как у основной базы) или файлы SQLite. Безопасные
+# запросы читают с реплик (foodgram.db_router), а после своей записи клиент
+# READ_YOUR_WRITES_SECONDS секунд читает с основной базы.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+# Кеш в памяти процесса: сдвиг версий и отзыв токенов из одного воркера
+# не видны другим, поэтому кеш ответов и кеш токенов по умолчанию выключены.
+PROCESS_LOCAL_CACHE = CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache'))
+
+# Время жизни закешированных ответов /api/recipes/ в секундах
+RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_TIMEOUT', 0 if PROCESS_LOCAL_CACHE else 300)
+)
+
+# Кеш токенов (api.authentication): размер LRU в процессе, TTL в секундах
+# и дублирование записей в общем кеше Django. Работает только с общим
+# CACHE_BACKEND: через него до всех воркеров доходит отзыв токена.
+TOKEN_CACHE_SIZE = int(
+    os.getenv('TOKEN_CACHE_SIZE', 0 if PROCESS_LOCAL_CACHE else 10000)
+)
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'false').lower() == 'true'
+
+# Запросы дольше порога пишутся в лог foodgram.requests с самым долгим SQL.
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500))
 
 
 # Password validation
@@ -128,7 +207,7 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
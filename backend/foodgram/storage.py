@@ -0,0 +1,54 @@
+"""Хранилище медиафайлов с адресацией по содержимому."""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Называет загружаемые файлы по SHA-256 содержимого.
+
+    Повторная загрузка той же картинки (фронтенд присылает её при каждом
+    PATCH рецепта) не пишет файл заново, а возвращает существующее имя
+    и обновляет время изменения файла.
+    Содержимое файла с данным именем никогда не меняется, поэтому его
+    можно отдавать с `Cache-Control: immutable` (см. infra/nginx.conf).
+    Файлы могут использоваться несколькими объектами, поэтому удаляет
+    их только команда `gc_media`.
+    """
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, sha256.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        try:
+            # Повторная ссылка на файл: gc_media отсчитывает --min-age от
+            # mtime, и ещё не сохранённый в БД объект не потеряет файл.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+    def save_as(self, name, content, max_length=None):
+        """Сохраняет файл под заданным именем (производные картинки)."""
+        return super().save(name, content, max_length=max_length)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    return media_storage
@@ -0,0 +1,17 @@
+"""
+Корневой urlconf для запросов под ASGI: горячие GET-эндпоинты
+обслуживаются асинхронными вьюхами, остальное — как в foodgram.urls.
+"""
+from django.urls import path
+
+from api.async_views import ingredient_list, recipe_detail, recipe_get_link
+from foodgram.urls import urlpatterns as sync_urlpatterns
+from recipes.views import ashort_link_redirect_view
+
+urlpatterns = [
+    path('api/ingredients/', ingredient_list),
+    path('api/recipes/<int:pk>/', recipe_detail),
+    path('api/recipes/<int:pk>/get-link/', recipe_get_link),
+    path('s/<short:recipe_id>/', ashort_link_redirect_view),
+    path('<int:recipe_id>/', ashort_link_redirect_view),
+] + sync_urlpatterns
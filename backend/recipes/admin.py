@@ -1,6 +1,13 @@
 from django.contrib import admin
+from django.core.cache import cache
+from django.utils.html import format_html_join
 from django.utils.safestring import mark_safe
 from django.contrib.admin import SimpleListFilter
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from .cart_totals import recipe_ingredients_changing
+from .paginators import EstimatedCountPaginator
+from .search import get_search_backend
 from .models import (
     Recipe, Ingredient, RecipeIngredient,
     Favorite, ShoppingCart, Subscription
@@ -10,28 +17,66 @@ from .models import (
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class CookingTimeFilter(admin.SimpleListFilter):
+    """
+    Три диапазона времени готовки по третям различных значений.
+
+    Границы и размеры диапазонов считаются в SQL и кешируются на
+    BOUNDS_TIMEOUT секунд, так что список не пересчитывает их при каждом
+    открытии.
+    """
     title = 'Время готовки'
     parameter_name = 'cooking_time_range'
+    BOUNDS_CACHE_KEY = 'admin:cooking_time_bounds'
+    BOUNDS_TIMEOUT = 600
+
+    def __init__(self, request, params, model, model_admin):
+        self.n = self.m = None
+        super().__init__(request, params, model, model_admin)
+
+    @classmethod
+    def get_bounds(cls):
+        bounds = cache.get(cls.BOUNDS_CACHE_KEY)
+        if bounds is None:
+            bounds = cls.compute_bounds()
+            cache.set(cls.BOUNDS_CACHE_KEY, bounds, cls.BOUNDS_TIMEOUT)
+        return bounds
+
+    @staticmethod
+    def compute_bounds():
+        times = Recipe.objects.order_by('cooking_time').values_list(
+            'cooking_time', flat=True
+        ).distinct()
+        total = times.count()
+        if total < 3:
+            return ()
+        n = times[int(total * 0.33)]
+        m = times[int(total * 0.66)]
+        counts = Recipe.objects.aggregate(
+            lt=Count('pk', filter=Q(cooking_time__lt=n)),
+            range=Count('pk', filter=Q(cooking_time__gte=n, cooking_time__lte=m)),
+            gt=Count('pk', filter=Q(cooking_time__gt=m)),
+        )
+        return n, m, counts
 
     def lookups(self, request, model_admin):
-        times = sorted(set(Recipe.objects.values_list('cooking_time', flat=True)))
-        if len(times) < 3:
+        bounds = self.get_bounds()
+        if not bounds:
             return ()
-
-        self.n = times[int(len(times) * 0.33)]
-        self.m = times[int(len(times) * 0.66)]
-
+        self.n, self.m, counts = bounds
         return [
-            ('lt', f'Меньше {self.n} мин ({Recipe.objects.filter(cooking_time__lt=self.n).count()})'),
-            ('range', f'От {self.n} до {self.m} мин ({Recipe.objects.filter(cooking_time__gte=self.n, cooking_time__lte=self.m).count()})'),
-            ('gt', f'Больше {self.m} мин ({Recipe.objects.filter(cooking_time__gt=self.m).count()})'),
+            ('lt', f'Меньше {self.n} мин ({counts["lt"]})'),
+            ('range', f'От {self.n} до {self.m} мин ({counts["range"]})'),
+            ('gt', f'Больше {self.m} мин ({counts["gt"]})'),
         ]
 
     def queryset(self, request, queryset):
         value = self.value()
+        if self.n is None:
+            return queryset
         if value == 'lt':
             return queryset.filter(cooking_time__lt=self.n)
         if value == 'range':
@@ -47,19 +92,51 @@ class RecipeAdmin(admin.ModelAdmin):
         'id', 'name', 'cooking_time', 'author',
         'show_favorites_count', 'show_ingredients', 'show_image'
     )
+    # Фильтр по автору вывел бы в боковую панель всех пользователей:
+    # автора ищут поиском, а в форме выбирают через автодополнение.
     search_fields = ('name', 'author__username')
-    list_filter = ('author', CookingTimeFilter)
+    list_filter = (CookingTimeFilter,)
+    autocomplete_fields = ('author',)
+    list_select_related = ('author',)
     inlines = [RecipeIngredientInline]
     readonly_fields = ('show_favorites_count', 'show_image')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        matches = get_search_backend(queryset.db).filter(
+            Recipe.objects.all(), search_term
+        )
+        # Автор ищется по вхождению в username, как в search_fields.
+        return queryset.filter(
+            Q(pk__in=matches.values('pk'))
+            | Q(author__username__icontains=search_term)
+        ), False
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        with recipe_ingredients_changing(form.instance):
+            super().save_related(request, form, formsets, change)
 
     @admin.display(description='В избранном')
     def show_favorites_count(self, recipe):
-        return recipe.favorited_by.count()
+        return recipe.favorites_count
 
     @admin.display(description='Ингредиенты')
     def show_ingredients(self, recipe):
-        return format_html('<br>'.join(
-            f'{ri.ingredient.name} ({ri.amount}{ri.ingredient.measurement_unit})'
+        return format_html_join(mark_safe('<br>'), '{} ({}{})', (
+            (ri.ingredient.name, ri.amount, ri.ingredient.measurement_unit)
             for ri in recipe.recipe_ingredients.all()
         ))
 
@@ -83,10 +160,11 @@ class HasRecipesFilter(SimpleListFilter):
         return self.LOOKUPS
 
     def queryset(self, request, queryset):
+        used = Exists(RecipeIngredient.objects.filter(ingredient=OuterRef('pk')))
         if self.value() == 'yes':
-            return queryset.filter(recipe__isnull=False).distinct()
+            return queryset.filter(used)
         elif self.value() == 'no':
-            return queryset.filter(recipe__isnull=True)
+            return queryset.filter(~used)
         return queryset
 
 
@@ -95,7 +173,21 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit', 'recipes_count')
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit', HasRecipesFilter)
-
-    @admin.display(description='Рецептов')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк текущей страницы.
+        return super().get_queryset(request).annotate(
+            recipes_total=Coalesce(Subquery(
+                RecipeIngredient.objects.filter(
+                    ingredient=OuterRef('pk')
+                ).order_by().values('ingredient').annotate(
+                    total=Count('*')
+                ).values('total')
+            ), 0)
+        )
+
+    @admin.display(description='Рецептов', ordering='recipes_total')
     def recipes_count(self, ingredient):
-        return ingredient.ingredient_recipes.count()
+        return ingredient.recipes_total
@@ -0,0 +1,96 @@
+"""Инкрементальное обновление сумм ингредиентов в корзинах пользователей."""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(recipe_id):
+    """Количество каждого ингредиента рецепта: {ingredient_id: amount}."""
+    return Counter(dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id', 'amount'
+        )
+    ))
+
+
+def cart_user_ids(recipe_id):
+    return list(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        )
+    )
+
+
+def adjust_totals(user_ids, deltas):
+    """
+    Прибавляет deltas ({ingredient_id: изменение}) к суммам пользователей.
+
+    Три запроса независимо от числа пользователей и ингредиентов:
+    вставка недостающих строк, UPDATE с CASE и удаление обнулившихся.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id, ingredient_id=pk, amount=0)
+                for user_id in user_ids
+                for pk, delta in deltas.items() if delta > 0
+            ),
+            ignore_conflicts=True
+        )
+        items = ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+        items.update(amount=F('amount') + Case(
+            *(When(ingredient_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()),
+            default=Value(0)
+        ))
+        items.filter(amount__lte=0).delete()
+
+
+def add_recipe_to_cart(user_id, recipe_id):
+    adjust_totals([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_cart(user_id, recipe_id):
+    adjust_totals(
+        [user_id],
+        {pk: -amount for pk, amount in recipe_amounts(recipe_id).items()}
+    )
+
+
+@contextmanager
+def recipe_ingredients_changing(recipe):
+    """
+    Оборачивает изменение ингредиентов рецепта: после блока разница
+    «стало − было» применяется к корзинам, где лежит рецепт, а если
+    состав изменился — сдвигается updated_at рецепта.
+    """
+    with transaction.atomic():
+        before = recipe_amounts(recipe.pk)
+        yield
+        after = recipe_amounts(recipe.pk)
+        after.subtract(before)
+        if any(after.values()):
+            Recipe.objects.filter(pk=recipe.pk).update(updated_at=timezone.now())
+        adjust_totals(cart_user_ids(recipe.pk), after)
+
+
+def live_totals(user_ids=None):
+    """Суммы, посчитанные напрямую по RecipeIngredient и ShoppingCart."""
+    queryset = RecipeIngredient.objects.filter(
+        recipe__in_shopping_cart__isnull=False
+    )
+    if user_ids is not None:
+        queryset = queryset.filter(recipe__in_shopping_cart__user__in=user_ids)
+    return queryset.values_list(
+        'recipe__in_shopping_cart__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
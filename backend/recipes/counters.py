@@ -0,0 +1,77 @@
+"""Денормализованные счётчики на Recipe и User."""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+from users.models import User
+
+# (модель со счётчиком, поле счётчика, модель связи, FK связи на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (User, 'subscriptions_count', Subscription, 'user'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик через F(), не опускаясь ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def counters_for(relation):
+    """Счётчики, которые меняются при создании или удалении строки relation."""
+    return [
+        (model, field, fk)
+        for model, field, related, fk in COUNTERS if related is relation
+    ]
+
+
+def actual_count(related, fk):
+    return Coalesce(Subquery(
+        related.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+            fk
+        ).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def reconcile(apply=True):
+    """
+    Сверяет счётчики с живыми COUNT по связям и при apply=True чинит
+    расхождения. Возвращает {'Model.field': число расхождений}.
+    """
+    drift = {}
+    for model, field, related, fk in COUNTERS:
+        stale = model.objects.annotate(
+            actual=actual_count(related, fk)
+        ).exclude(**{field: F('actual')})
+        ids = list(stale.values_list('pk', flat=True))
+        drift[f'{model.__name__}.{field}'] = len(ids)
+        if apply and ids:
+            model.objects.filter(pk__in=ids).update(
+                **{field: actual_count(related, fk)}
+            )
+    return drift
+
+
+def bulk_change_counters(relation, instances, sign):
+    """
+    Меняет счётчики для пачки строк relation, созданных через bulk_create
+    или удалённых без сигналов. Один UPDATE на каждое различное приращение.
+    """
+    for model, field, fk in counters_for(relation):
+        per_target = Counter(getattr(obj, f'{fk}_id') for obj in instances)
+        by_delta = defaultdict(list)
+        for pk, count in per_target.items():
+            by_delta[count].append(pk)
+        for count, pks in by_delta.items():
+            queryset = model.objects.filter(pk__in=pks)
+            if sign < 0:
+                queryset = queryset.filter(**{f'{field}__gte': count})
+            queryset.update(**{field: F(field) + sign * count})
@@ -0,0 +1,80 @@
+"""Производные изображений рецептов: миниатюры и WebP."""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+
+ORIGINAL = 'original'
+
+# Имя варианта -> (максимальная сторона или None, формат Pillow, расширение)
+VARIANTS = {
+    'thumbnail': (480, 'JPEG', 'jpg'),
+    'thumbnail_webp': (480, 'WEBP', 'webp'),
+    'webp': (None, 'WEBP', 'webp'),
+}
+IMAGE_SIZES = (ORIGINAL, *VARIANTS)
+
+
+def variant_name(name, variant):
+    """recipes/abc.png -> recipes/abc.thumbnail.jpg"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.{VARIANTS[variant][2]}'
+
+
+def _render(image, variant):
+    max_side, image_format, _ = VARIANTS[variant]
+    image = image.copy()
+    if max_side:
+        image.thumbnail((max_side, max_side))
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=82)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(fieldfile, variants=None, force=False):
+    """
+    Сохраняет варианты рядом с оригиналом в том же хранилище.
+    Возвращает список созданных имён файлов.
+    """
+    storage = fieldfile.storage
+    names = {
+        variant: variant_name(fieldfile.name, variant)
+        for variant in variants or VARIANTS
+    }
+    if not force:
+        names = {
+            variant: name for variant, name in names.items()
+            if not storage.exists(name)
+        }
+    if not names:
+        return []
+    with storage.open(fieldfile.name, 'rb') as original:
+        image = Image.open(original)
+        image.load()
+    # Хранилище с адресацией по содержимому переименовало бы вариант по хешу.
+    save = getattr(storage, 'save_as', storage.save)
+    created = []
+    for variant, name in names.items():
+        if storage.exists(name):
+            storage.delete(name)
+        created.append(save(name, _render(image, variant)))
+    return created
+
+
+def variant_url(fieldfile, variant):
+    """
+    URL варианта изображения. Недостающий вариант создаётся при первом
+    обращении; если исходник не читается, возвращается оригинал.
+    """
+    if variant not in VARIANTS:
+        return fieldfile.url
+    name = variant_name(fieldfile.name, variant)
+    if not fieldfile.storage.exists(name):
+        try:
+            generate_variants(fieldfile, [variant])
+        except (OSError, UnidentifiedImageError):
+            return fieldfile.url
+    return fieldfile.storage.url(name)
@@ -0,0 +1,112 @@
+"""Индекс названий ингредиентов в памяти процесса для автодополнения."""
+import hashlib
+import threading
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.models import Ingredient
+
+VERSION_CACHE_KEY = 'ingredient_index:version'
+
+
+class IngredientIndex:
+    """
+    Отсортированный список названий ингредиентов в нижнем регистре.
+
+    Поиск по префиксу — два бинарных поиска без обращения к БД. Индекс
+    строится лениво при первом запросе и сбрасывается сигналами
+    `Ingredient` и командой `import_ingredients`. Версия в кеше Django
+    позволяет сбросить индекс и в остальных процессах при общем кеше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (keys, rows, digest, version) публикуется одним присваиванием:
+        # читатель всегда видит согласованный снимок, даже во время сброса.
+        self._snapshot = None
+
+    def _current_version(self):
+        return cache.get(VERSION_CACHE_KEY, 0)
+
+    def _build(self, version):
+        # Индекс живёт дольше запроса: строится с основной базы, не с реплики.
+        rows = sorted(
+            (name.lower(), name, pk, unit)
+            for pk, name, unit in Ingredient.objects.using(
+                DEFAULT_DB_ALIAS
+            ).values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self._snapshot = (
+            tuple(row[0] for row in rows),
+            tuple(
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for _, name, pk, unit in rows
+            ),
+            hashlib.md5(repr(rows).encode()).hexdigest(),
+            version,
+        )
+        return self._snapshot
+
+    def _fresh(self, version):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[3] == version:
+            return snapshot
+        return None
+
+    def _ensure_built(self, version=None):
+        if version is None:
+            version = self._current_version()
+        snapshot = self._fresh(version)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            return self._fresh(version) or self._build(version)
+
+    async def _aensure_built(self):
+        version = await cache.aget(VERSION_CACHE_KEY, 0)
+        snapshot = self._fresh(version)
+        if snapshot is not None:
+            return snapshot
+        return await sync_to_async(self._ensure_built)(version)
+
+    def search(self, prefix=''):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        return self._lookup(self._ensure_built(), prefix)
+
+    async def asearch(self, prefix=''):
+        """search для асинхронных вьюх: поток нужен только для сборки."""
+        return self._lookup(await self._aensure_built(), prefix)
+
+    def fingerprint(self):
+        """Хеш содержимого индекса — одинаков во всех процессах с теми же данными."""
+        return self._ensure_built()[2]
+
+    async def afingerprint(self):
+        return (await self._aensure_built())[2]
+
+    @staticmethod
+    def _lookup(snapshot, prefix):
+        keys, rows = snapshot[:2]
+        prefix = prefix.lower()
+        if not prefix:
+            return list(rows)
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + '\U0010ffff', lo=start)
+        return list(rows[start:end])
+
+    def invalidate(self):
+        """Сбрасывает индекс в этом процессе и повышает общую версию."""
+        with self._lock:
+            self._snapshot = None
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,252 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.pagination import RecipePagination
+from recipes.models import Ingredient, Recipe
+from recipes.short_links import encode
+from users.models import User
+
+MEMORY_SAMPLES = 3
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def consume(response):
+    """Дочитывает потоковый ответ: его запросы к БД идут при чтении тела."""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет маршруты api/urls.py через тестовый клиент и выводит '
+        'p50/p95/p99 задержки, число запросов к БД и пик памяти; '
+        'результат можно сохранить в JSON и сравнить с прошлым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--only', action='append',
+            help='Прогнать только этот сценарий (можно повторять)'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения'
+        )
+
+    def scenarios(self, user):
+        """Сценарий — (имя, аутентифицирован ли, функция client -> [ответы])."""
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        author = User.objects.order_by('-recipes_count').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        other = Recipe.objects.exclude(author=user).exclude(
+            favorited__user=user
+        ).exclude(in_shopping_cart__user=user).order_by('-id').first()
+        target = User.objects.exclude(pk=user.pk).exclude(
+            subscribers__user=user
+        ).order_by('-subscribers_count').first()
+        word = recipe.name.split()[0]
+        # Середина ленты: OFFSET растёт вместе с таблицей.
+        middle_page = Recipe.objects.count() // RecipePagination.page_size // 2 + 1
+
+        def get(path):
+            return lambda client: [consume(client.get(path))]
+
+        def toggle(path):
+            return lambda client: [client.post(path), client.delete(path)]
+
+        def bulk(path, ids):
+            return lambda client: [
+                client.post(path, {'ids': ids}, format='json'),
+                client.delete(path, {'ids': ids}, format='json'),
+            ]
+
+        some_ids = list(Recipe.objects.exclude(
+            favorited__user=user
+        ).order_by('id').values_list('id', flat=True)[:20])
+        scenarios = [
+            ('recipes-list-anon', False, get('/api/recipes/')),
+            ('recipes-list', True, get('/api/recipes/')),
+            ('recipes-list-deep-page', True, get(f'/api/recipes/?page={middle_page}')),
+            ('recipes-filter-favorited', True, get('/api/recipes/?is_favorited=1')),
+            ('recipes-filter-cart', True, get('/api/recipes/?is_in_shopping_cart=1')),
+            ('recipes-filter-author', True, get(f'/api/recipes/?author={author.id}')),
+            ('recipes-search', True, get(f'/api/recipes/?search={word}')),
+            ('recipe-detail', True, get(f'/api/recipes/{recipe.id}/')),
+            ('recipe-get-link', False, get(f'/api/recipes/{recipe.id}/get-link/')),
+            ('short-link-redirect', False, get(f'/{recipe.id}/')),
+            ('short-code-redirect', False, get(f'/s/{encode(recipe.id)}/')),
+            ('shopping-cart-summary', True, get('/api/recipes/shopping_cart/')),
+            ('download-shopping-cart', True, get('/api/recipes/download_shopping_cart/')),
+            ('ingredients-search', False, get('/api/ingredients/?name=мол')),
+            ('ingredients-list', False, get('/api/ingredients/')),
+            ('users-list', True, get('/api/users/')),
+            ('user-detail', True, get(f'/api/users/{author.id}/')),
+            ('users-me', True, get('/api/users/me/')),
+            ('subscriptions', True, get('/api/users/subscriptions/?recipes_limit=3')),
+        ]
+        # Сценарии, которым не нашлось данных, пропускаются с сообщением.
+        if ingredient is None:
+            self.skip(['ingredient-detail'], 'нет ингредиентов')
+        else:
+            scenarios.append(('ingredient-detail', False, get(f'/api/ingredients/{ingredient.id}/')))
+        if other is None:
+            self.skip(
+                ['favorite-toggle', 'shopping-cart-toggle'],
+                'нет чужого рецепта вне избранного и корзины'
+            )
+        else:
+            scenarios += [
+                ('favorite-toggle', True, toggle(f'/api/recipes/{other.id}/favorite/')),
+                ('shopping-cart-toggle', True, toggle(f'/api/recipes/{other.id}/shopping_cart/')),
+            ]
+        if target is None:
+            self.skip(['subscribe-toggle'], 'нет автора без подписки')
+        else:
+            scenarios.append(('subscribe-toggle', True, toggle(f'/api/users/{target.id}/subscribe/')))
+        if not some_ids:
+            self.skip(['favorite-bulk'], 'нет рецептов вне избранного')
+        else:
+            scenarios.append(('favorite-bulk', True, bulk('/api/recipes/favorite/', some_ids)))
+        return scenarios
+
+    def skip(self, names, reason):
+        self.stdout.write(self.style.WARNING(
+            f'Пропущены {", ".join(names)}: {reason}.'
+        ))
+
+    def measure(self, run, client, options):
+        for _ in range(options['warmup']):
+            run(client)
+        timings, queries, errors = [], [], 0
+        for _ in range(options['iterations']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                responses = run(client)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(ctx.captured_queries))
+            errors += sum(response.status_code >= 400 for response in responses)
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(MEMORY_SAMPLES):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                run(client)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        return {
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': round(statistics.fmean(queries), 2),
+            'max_queries': max(queries),
+            'peak_memory_kb': round(max(peaks) / 1024, 1),
+            'errors': errors,
+        }
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть положительным.')
+        user = User.objects.order_by('-subscriptions_count', 'id').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('Нет данных, сначала выполните seed_bench_data.')
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = APIClient(SERVER_NAME='localhost')
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        results = {}
+        for name, authenticated, run in self.scenarios(user):
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self.measure(
+                run, client if authenticated else anonymous, options
+            )
+            self.report(name, results[name])
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'cold_cache': options['cold'],
+                'rows': {
+                    'users': User.objects.count(),
+                    'recipes': Recipe.objects.count(),
+                },
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def report(self, name, result):
+        line = (
+            f'{name:<28} p50={result["p50_ms"]:8.2f} мс '
+            f'p95={result["p95_ms"]:8.2f} мс p99={result["p99_ms"]:8.2f} мс '
+            f'запросов={result["queries"]:5.1f} '
+            f'память={result["peak_memory_kb"]:8.1f} КиБ'
+        )
+        if result['errors']:
+            line = self.style.ERROR(f'{line} ошибок={result["errors"]}')
+        self.stdout.write(line)
+
+    def compare(self, path, results):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        self.stdout.write(f'\nСравнение с {path}:')
+        for name, result in results.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            change = (result['p50_ms'] - old['p50_ms']) / max(old['p50_ms'], 1e-6)
+            self.stdout.write(
+                f'{name:<28} p50 {old["p50_ms"]:.2f} → {result["p50_ms"]:.2f} мс '
+                f'({change:+.0%}), запросов '
+                f'{old["queries"]:.1f} → {result["queries"]:.1f}'
+            )
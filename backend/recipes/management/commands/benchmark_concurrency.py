@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+
+from recipes.management.commands.benchmark_api import percentile
+from recipes.models import Recipe
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность горячих GET-эндпоинтов '
+        '(поиск ингредиентов, рецепт, get-link, короткая ссылка) под '
+        'синхронным WSGI-обработчиком и под ASGI с асинхронными вьюхами '
+        'при одинаковом числе параллельных клиентов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument(
+            '--concurrency', type=int, default=32,
+            help='Параллельных клиентов'
+        )
+        parser.add_argument(
+            '--wsgi-workers', type=int, default=1,
+            help='Синхронных воркеров WSGI (gunicorn по умолчанию запускает один)'
+        )
+        parser.add_argument(
+            '--db-latency', type=float, default=0,
+            help='Добавочная задержка каждого SQL в мс (сетевая БД)'
+        )
+        parser.add_argument('--mode', choices=MODES, action='append')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def paths(self, count):
+        ids = list(Recipe.objects.order_by('-id').values_list('id', flat=True)[:50])
+        if not ids:
+            raise CommandError('Нет рецептов, сначала выполните seed_bench_data.')
+        routes = cycle([
+            lambda pk: '/api/ingredients/?name=мо',
+            lambda pk: f'/api/recipes/{pk}/',
+            lambda pk: f'/api/recipes/{pk}/get-link/',
+            lambda pk: f'/{pk}/',
+        ])
+        return [
+            route(pk) for route, pk in islice(zip(routes, cycle(ids)), count)
+        ]
+
+    def add_db_latency(self, milliseconds):
+        delay = milliseconds / 1000
+
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        connection_created.connect(install, weak=False)
+        if connection.connection is not None:
+            connection.execute_wrappers.append(slow)
+
+    def run_wsgi(self, paths, concurrency, workers):
+        """concurrency клиентов ждут ответа от пула из workers потоков."""
+        local = threading.local()
+
+        def handle(path):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            return local.client.get(path).status_code
+
+        server = ThreadPoolExecutor(max_workers=workers)
+
+        def request(path):
+            started = time.perf_counter()
+            status = server.submit(handle, path).result()
+            return time.perf_counter() - started, status
+
+        with server, ThreadPoolExecutor(max_workers=concurrency) as clients:
+            return list(clients.map(request, paths))
+
+    def run_asgi(self, paths, concurrency):
+        client = AsyncClient()
+        queue = iter(paths)
+
+        async def worker(results):
+            for path in queue:
+                started = time.perf_counter()
+                # Как ASGIHandler: у каждого запроса свой поток для sync-кода.
+                async with ThreadSensitiveContext():
+                    response = await client.get(path)
+                results.append((time.perf_counter() - started, response.status_code))
+
+        async def main():
+            results = []
+            await asyncio.gather(*(worker(results) for _ in range(concurrency)))
+            return results
+
+        return asyncio.run(main())
+
+    def handle(self, *args, **options):
+        if options['db_latency']:
+            self.add_db_latency(options['db_latency'])
+        paths = self.paths(options['requests'])
+        report = {
+            'meta': {
+                'requests': len(paths),
+                'concurrency': options['concurrency'],
+                'wsgi_workers': options['wsgi_workers'],
+                'db_latency_ms': options['db_latency'],
+                'async_read_views': settings.ASYNC_READ_VIEWS,
+                'database': connection.vendor,
+            },
+            'results': {},
+        }
+        for mode in options['mode'] or MODES:
+            cache.clear()
+            started = time.perf_counter()
+            # Тестовые клиенты ходят на хост testserver.
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+            ):
+                if mode == 'wsgi':
+                    samples = self.run_wsgi(
+                        paths, options['concurrency'], options['wsgi_workers']
+                    )
+                else:
+                    samples = self.run_asgi(paths, options['concurrency'])
+            elapsed = time.perf_counter() - started
+            timings = [duration * 1000 for duration, _ in samples]
+            result = report['results'][mode] = {
+                'rps': round(len(samples) / elapsed, 1),
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'errors': sum(status >= 400 for _, status in samples),
+            }
+            self.stdout.write(
+                f'{mode}: {result["rps"]} запросов/с, '
+                f'p50={result["p50_ms"]} мс, p95={result["p95_ms"]} мс, '
+                f'p99={result["p99_ms"]} мс, ошибок {result["errors"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,129 @@
+import copy
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import ConnectionHandler
+
+from recipes.management.commands.benchmark_api import percentile
+
+MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет стоимость установки соединения с БД на запрос: новое '
+        'соединение на каждый запрос (CONN_MAX_AGE=0), постоянное '
+        'соединение с проверкой здоровья и пул psycopg 3 (только PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--queries', type=int, default=3,
+            help='SQL-запросов на один HTTP-запрос'
+        )
+        parser.add_argument(
+            '--connect-latency', type=float, default=0,
+            help=(
+                'Добавочная задержка открытия соединения в мс (TCP, TLS и '
+                'аутентификация сетевой БД; для пула не применяется)'
+            )
+        )
+        parser.add_argument('--mode', choices=MODES, action='append')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def make_connection(self, mode):
+        """Отдельное соединение с настройками default и режимом mode."""
+        config = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+        config['CONN_MAX_AGE'] = 600 if mode == 'persistent' else 0
+        config['CONN_HEALTH_CHECKS'] = mode == 'persistent'
+        options = config.setdefault('OPTIONS', {})
+        options.pop('pool', None)
+        if mode == 'pool':
+            options['pool'] = True
+        return ConnectionHandler({DEFAULT_DB_ALIAS: config})[DEFAULT_DB_ALIAS]
+
+    def run(self, mode, requests, queries, connect_latency):
+        connection = self.make_connection(mode)
+        opened = 0
+
+        def on_connect(sender, **kwargs):
+            nonlocal opened
+            if kwargs['connection'] is not connection:
+                return
+            opened += 1
+            if connect_latency and mode != 'pool':
+                time.sleep(connect_latency / 1000)
+
+        connection_created.connect(on_connect, weak=False)
+        timings, setup = [], []
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                # Как close_old_connections на request_started/finished.
+                connection.close_if_unusable_or_obsolete()
+                connection.ensure_connection()
+                connected = time.perf_counter()
+                with connection.cursor() as cursor:
+                    for _ in range(queries):
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                timings.append((time.perf_counter() - started) * 1000)
+                setup.append((connected - started) * 1000)
+        finally:
+            connection_created.disconnect(on_connect)
+            connection.close()
+            if mode == 'pool':
+                connection.close_pool()
+        return {
+            'connections_opened': opened,
+            'setup_ms_per_request': round(sum(setup) / len(setup), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+        }
+
+    def pool_unavailable(self):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            return 'пул поддерживается только для PostgreSQL'
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            return 'не установлен psycopg_pool'
+        return None
+
+    def handle(self, *args, **options):
+        default = connections[DEFAULT_DB_ALIAS]
+        report = {
+            'meta': {
+                'requests': options['requests'],
+                'queries_per_request': options['queries'],
+                'connect_latency_ms': options['connect_latency'],
+                'database': default.vendor,
+                'conn_max_age': default.settings_dict['CONN_MAX_AGE'],
+                'pool': bool(default.settings_dict['OPTIONS'].get('pool')),
+            },
+            'results': {},
+        }
+        for mode in options['mode'] or MODES:
+            reason = self.pool_unavailable() if mode == 'pool' else None
+            if reason:
+                self.stdout.write(f'{mode}: пропущен — {reason}')
+                continue
+            result = report['results'][mode] = self.run(
+                mode, options['requests'], options['queries'],
+                options['connect_latency']
+            )
+            self.stdout.write(
+                f'{mode}: соединений {result["connections_opened"]}, '
+                f'установка {result["setup_ms_per_request"]} мс/запрос, '
+                f'запрос в среднем {result["mean_ms"]} мс, '
+                f'p50={result["p50_ms"]} мс, p95={result["p95_ms"]} мс'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку поиска ингредиентов по префиксу: '
+        'ORM (name__istartswith) против индекса в памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторить каждый префикс'
+        )
+        parser.add_argument(
+            '--max-prefix', type=int, default=3,
+            help='Максимальная длина префикса'
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True)[:200])
+        if not names:
+            self.stdout.write(self.style.ERROR(
+                'Каталог пуст, сначала выполните import_ingredients.'
+            ))
+            return
+        prefixes = sorted({
+            name[:length].lower()
+            for name in names
+            for length in range(1, options['max_prefix'] + 1)
+        })
+
+        def orm(prefix):
+            return list(Ingredient.objects.filter(
+                name__istartswith=prefix
+            ).values('id', 'name', 'measurement_unit'))
+
+        ingredient_index.invalidate()
+        start = time.perf_counter()
+        ingredient_index.search('')
+        build = (time.perf_counter() - start) * 1000
+        self.stdout.write(f'Построение индекса: {build:.2f} мс')
+
+        for label, lookup in (('ORM', orm), ('Индекс', ingredient_index.search)):
+            timings = []
+            for _ in range(options['repeat']):
+                for prefix in prefixes:
+                    start = time.perf_counter()
+                    lookup(prefix)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{label}: {len(timings)} запросов, '
+                f'p50={statistics.median(timings):.4f} мс, '
+                f'p95={timings[int(len(timings) * 0.95)]:.4f} мс'
+            )
@@ -0,0 +1,167 @@
+import json
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.management.commands.benchmark_api import (
+    Command as BenchmarkApi, consume
+)
+from users.models import User
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+# «SCAN recipes_recipe» без «USING INDEX» — полный проход по таблице.
+SQLITE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+SQLITE_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?("?)([A-Z]\d+)\2')
+ORDERED_LIMIT_RE = re.compile(
+    r'\bORDER BY [^()]+ LIMIT \d+(?: OFFSET \d+)?\s*$'
+)
+
+
+def table_sizes():
+    """Число строк во всех таблицах моделей проекта."""
+    sizes = {}
+    for model in apps.get_models():
+        if model._meta.managed and not model._meta.proxy:
+            sizes[model._meta.db_table] = model._base_manager.count()
+    return sizes
+
+
+def _sqlite_scans(sql):
+    aliases = {
+        alias: table for table, _, alias in SQLITE_ALIAS_RE.findall(sql)
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        rows = cursor.fetchall()
+    plan = [row[3] for row in rows]
+    # Внешний SCAN в порядке ORDER BY (например, по rowid) без сортировки
+    # во временном B-дереве останавливается на LIMIT — это не полный проход.
+    bounded = ORDERED_LIMIT_RE.search(sql) and not any(
+        detail.startswith('USE TEMP B-TREE') for detail in plan
+    )
+    scans = set()
+    for _, parent, _, detail in rows:
+        match = SQLITE_SCAN_RE.match(detail)
+        if match and not (bounded and parent == 0):
+            scans.add(aliases.get(match[1], match[1]))
+    return plan, scans
+
+
+def _postgresql_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _postgresql_nodes(child)
+
+
+def _postgresql_scans(sql):
+    # Без seq scan планировщик уходит в индекс, если тот вообще подходит:
+    # результат не зависит от размера таблиц и свежести статистики.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+    nodes = list(_postgresql_nodes(plan[0]['Plan']))
+    return plan, {
+        node['Relation Name'] for node in nodes
+        if node['Node Type'] == 'Seq Scan'
+    }
+
+
+def full_scans(sql):
+    """(план, таблицы, которые запрос читает полным проходом)."""
+    if connection.vendor == 'sqlite':
+        return _sqlite_scans(sql)
+    if connection.vendor == 'postgresql':
+        return _postgresql_scans(sql)
+    raise CommandError(f'EXPLAIN для {connection.vendor} не поддерживается.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет SQL сценариев benchmark_api через EXPLAIN и завершается '
+        'с ошибкой, если запрос читает полным проходом таблицу, в которой '
+        'не меньше --min-rows строк. Нужны данные seed_bench_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='С какого числа строк таблица считается большой'
+        )
+        parser.add_argument(
+            '--only', action='append',
+            help='Проверить только этот сценарий (можно повторять)'
+        )
+        parser.add_argument(
+            '--show-plans', action='store_true',
+            help='Печатать план каждого запроса'
+        )
+
+    def capture(self, run, client):
+        # Первый прогон прогревает индексы в памяти процесса (ингредиенты,
+        # короткие ссылки, токены): проверяется установившийся режим.
+        run(client)
+        with CaptureQueriesContext(connection) as ctx:
+            # Потоковый ответ (выгрузка списка покупок) выполняет запросы,
+            # пока отдаёт тело: дочитываем его до конца захвата.
+            responses = [consume(response) for response in run(client)]
+        failed = [r.status_code for r in responses if r.status_code >= 400]
+        if failed:
+            raise CommandError(f'Сценарий вернул ошибки {failed}.')
+        return [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].lstrip().upper().startswith(EXPLAINED)
+        ]
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('-subscriptions_count', 'id').first()
+        if user is None:
+            raise CommandError('Нет данных, сначала выполните seed_bench_data.')
+        large = {
+            table for table, rows in table_sizes().items()
+            if rows >= options['min_rows']
+        }
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = APIClient(SERVER_NAME='localhost')
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        problems = []
+        # Кеш ответов отключён: иначе повторный прогон не дойдёт до БД.
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0):
+            for name, authenticated, run in BenchmarkApi(
+                stdout=self.stdout, stderr=self.stderr
+            ).scenarios(user):
+                if options['only'] and name not in options['only']:
+                    continue
+                queries = self.capture(
+                    run, client if authenticated else anonymous
+                )
+                found = []
+                for sql in queries:
+                    plan, scans = full_scans(sql)
+                    if options['show_plans']:
+                        self.stdout.write(f'{sql}\n{plan}\n')
+                    found += [(table, sql) for table in sorted(scans & large)]
+                self.report(name, len(queries), found)
+                problems += found
+        if problems:
+            raise CommandError(
+                f'Полных проходов по большим таблицам: {len(problems)}.'
+            )
+
+    def report(self, name, queries, found):
+        line = f'{name:<28} запросов={queries:3d}'
+        if not found:
+            self.stdout.write(f'{line} ок')
+            return
+        self.stdout.write(self.style.ERROR(f'{line} полный проход:'))
+        for table, sql in found:
+            self.stdout.write(f'    {table}: {sql}')
@@ -0,0 +1,88 @@
+import base64
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+
+def recipe_record(recipe, embed_images=False):
+    """Рецепт как словарь NDJSON-выгрузки; ссылки — по естественным ключам."""
+    author = recipe.author
+    image = recipe.image.name or None
+    if image and embed_images:
+        with recipe.image.open('rb') as file:
+            image = {
+                'name': image,
+                'content': base64.b64encode(file.read()).decode(),
+            }
+    return {
+        'author': {
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': image,
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты с ингредиентами и авторами в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для записи или «-» для stdout'
+        )
+        parser.add_argument(
+            '--embed-images', action='store_true',
+            help='Встроить картинки в base64 вместо ссылки на путь в MEDIA_ROOT'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Рецептов в одном запросе к БД'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        ).order_by('id')
+        path = options['path']
+        try:
+            output = (
+                self.stdout if path == '-'
+                else open(path, 'w', encoding='utf-8')
+            )
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+        count = 0
+        try:
+            for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+                output.write(json.dumps(
+                    recipe_record(recipe, options['embed_images']),
+                    ensure_ascii=False
+                ) + '\n')
+                count += 1
+        finally:
+            if path != '-':
+                output.close()
+        self.stderr.write(f'Выгружено рецептов: {count}.')
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodgram.storage import media_storage
+from recipes.images import VARIANTS, variant_name
+from recipes.models import Recipe
+from users.models import User
+
+MEDIA_DIRS = ('recipes', 'avatars')
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы, на которые не ссылается ни один рецепт '
+        'или пользователь (вместе с производными картинками)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Не трогать файлы моложе N часов (идущие загрузки)'
+        )
+
+    def referenced(self):
+        names = set()
+        for name in Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).values_list('image', flat=True).iterator():
+            names.add(name)
+            names.update(variant_name(name, variant) for variant in VARIANTS)
+        names.update(
+            User.objects.exclude(avatar='').exclude(
+                avatar__isnull=True
+            ).values_list('avatar', flat=True).iterator()
+        )
+        return names
+
+    def handle(self, *args, **options):
+        referenced = self.referenced()
+        threshold = timezone.now() - timedelta(hours=options['min_age'])
+        removed = freed = 0
+        for directory in MEDIA_DIRS:
+            if not media_storage.exists(directory):
+                continue
+            for filename in media_storage.listdir(directory)[1]:
+                name = f'{directory}/{filename}'
+                if name in referenced:
+                    continue
+                if media_storage.get_modified_time(name) > threshold:
+                    continue
+                size = media_storage.size(name)
+                self.stdout.write(f'{name} ({size} байт)')
+                if not options['dry_run']:
+                    media_storage.delete(name)
+                removed += 1
+                freed += size
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, {freed / 1024 / 1024:.1f} МБ.'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from recipes.images import VARIANTS, generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры и WebP-варианты картинок существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие варианты'
+        )
+        parser.add_argument(
+            '--variant', action='append', choices=list(VARIANTS),
+            dest='variants', help='Создать только этот вариант'
+        )
+
+    def handle(self, *args, **options):
+        created = failed = 0
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).only('id', 'image').order_by('id')
+        for recipe in recipes.iterator(chunk_size=500):
+            try:
+                created += len(generate_variants(
+                    recipe.image, options['variants'], force=options['force']
+                ))
+            except (OSError, UnidentifiedImageError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано вариантов: {created}, ошибок: {failed}.'
+        ))
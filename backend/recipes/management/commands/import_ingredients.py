@@ -1,29 +1,111 @@
-import json
 import os
+import sys
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import MAX_NAME_LENGTH, MAX_UNIT_LENGTH, Ingredient
+from recipes.streams import (
+    FORMATS, chunked, detect_format, peek_line, read_records
+)
+
+DEFAULT_PATH = os.path.join(
+    settings.BASE_DIR, '..', 'data', 'ingredients.csv'
+)
 
 
 class Command(BaseCommand):
-    help = 'Импортирует ингредиенты из JSON-файла'
+    help = (
+        'Импортирует ингредиенты из CSV, JSON или NDJSON (файл или stdin) '
+        'порциями; существующие пары (название, единица) пропускаются'
+    )
+    stealth_options = ('stdin',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу или «-» для stdin (по умолчанию data/ingredients.csv)'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат данных (по умолчанию — по расширению или содержимому)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Строк в одной транзакции'
+        )
+
+    def rows(self, records):
+        for record in records:
+            try:
+                name = record['name'].strip()
+                unit = record['measurement_unit'].strip()
+            except (KeyError, TypeError, AttributeError):
+                self.skipped += 1
+                continue
+            if not name or not unit or (
+                len(name) > MAX_NAME_LENGTH or len(unit) > MAX_UNIT_LENGTH
+            ):
+                self.skipped += 1
+                continue
+            yield Ingredient(name=name, measurement_unit=unit)
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным.')
+        self.verbosity = options['verbosity']
+        self.skipped = 0
+        path = options['path']
+        if path == '-':
+            source = options.get('stdin', sys.stdin)
+        else:
+            try:
+                source = open(path, encoding='utf-8-sig', newline='')
+            except OSError as error:
+                raise CommandError(f'Не удалось открыть {path}: {error}')
         try:
-            filepath = os.path.normpath(os.path.join(settings.BASE_DIR, '..', 'data', 'ingredients.json'))
-            with open(filepath, encoding='utf-8') as f:
-                existing = set(
-                    Ingredient.objects.values_list('name', 'measurement_unit')
-                )
-                new_ingredients = [
-                    Ingredient(**item)
-                    for item in json.load(f)
-                    if (item['name'], item['measurement_unit']) not in existing
-                ]
-                created = Ingredient.objects.bulk_create(new_ingredients, ignore_conflicts=True)
-                self.stdout.write(
-                    self.style.SUCCESS(f'Добавлено {len(created)} новых ингредиентов.')
-                )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ошибка импорта: {e}'))
+            head, stream = peek_line(source)
+            fmt = options['format'] or detect_format(path, head)
+            self.load(read_records(stream, fmt), options['chunk_size'])
+        except ValueError as error:
+            raise CommandError(f'Ошибка разбора данных: {error}')
+        finally:
+            if path != '-':
+                source.close()
+
+    def load(self, records, chunk_size):
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        processed = 0
+        try:
+            for chunk in chunked(self.rows(records), chunk_size):
+                # Конфликт по unique_ingredient_unit означает, что строка уже
+                # есть: других полей у ингредиента нет, обновлять нечего.
+                with transaction.atomic():
+                    Ingredient.objects.bulk_create(chunk, ignore_conflicts=True)
+                processed += len(chunk)
+                self.progress(processed, started)
+        finally:
+            ingredient_index.invalidate()
+        elapsed = time.monotonic() - started
+        added = Ingredient.objects.count() - before
+        if self.stdout.isatty():
+            self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {processed} строк за {elapsed:.1f} с '
+            f'({processed / max(elapsed, 1e-6):.0f} строк/с), '
+            f'добавлено {added} новых ингредиентов, '
+            f'пропущено некорректных: {self.skipped}.'
+        ))
+
+    def progress(self, processed, started):
+        rate = processed / max(time.monotonic() - started, 1e-6)
+        message = f'{processed} строк, {rate:.0f} строк/с'
+        if self.stdout.isatty():
+            self.stdout.write(f'\r{message}', ending='')
+            self.stdout.flush()
+        elif self.verbosity > 1:
+            self.stdout.write(message)
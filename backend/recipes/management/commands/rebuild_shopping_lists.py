@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cart_totals import live_totals
+from recipes.models import ShoppingListItem
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает суммы списков покупок (ShoppingListItem) '
+        'или сверяет их с живым запросом по корзинам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить суммы, ничего не меняя'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Ограничиться пользователем с этим id (можно повторять)'
+        )
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if options['verify']:
+            return self.verify(users)
+        self.rebuild(users)
+
+    def stored_items(self, users):
+        queryset = ShoppingListItem.objects.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        return queryset
+
+    def rebuild(self, users):
+        created = 0
+        with transaction.atomic():
+            self.stored_items(users).delete()
+            chunk = []
+            for user_id, ingredient_id, total in live_totals(users).iterator(
+                chunk_size=CHUNK_SIZE
+            ):
+                chunk.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                ))
+                if len(chunk) >= CHUNK_SIZE:
+                    created += len(ShoppingListItem.objects.bulk_create(chunk))
+                    chunk = []
+            created += len(ShoppingListItem.objects.bulk_create(chunk))
+        self.stdout.write(
+            self.style.SUCCESS(f'Списки покупок пересобраны: {created} позиций.')
+        )
+
+    def verify(self, users):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in live_totals(users)
+        }
+        stored = dict(
+            ((user_id, ingredient_id), amount)
+            for user_id, ingredient_id, amount in self.stored_items(
+                users
+            ).values_list('user_id', 'ingredient_id', 'amount')
+        )
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in expected.keys() | stored.keys()
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, total in sorted(mismatches):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'сохранено {actual}, должно быть {total}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Суммы совпадают: {len(expected)} позиций.'
+        ))
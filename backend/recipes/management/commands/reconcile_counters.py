@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного, корзин, рецептов и подписок '
+        'с фактическими данными и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile(apply=not options['dry_run'])
+        for counter, stale in drift.items():
+            self.stdout.write(f'{counter}: расхождений {stale}')
+        total = sum(drift.values())
+        if options['dry_run']:
+            self.stdout.write(f'Найдено расхождений: {total}.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено счётчиков: {total}.'))
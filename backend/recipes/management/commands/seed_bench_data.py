@@ -0,0 +1,182 @@
+import random
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import bump_recipes_version
+from recipes.counters import reconcile
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Subscription
+)
+from recipes.short_links import recipe_ids
+from users.models import User
+
+BENCH_DOMAIN = 'bench.example'
+BENCH_PASSWORD = 'bench-password'
+
+
+def zipf_weights(count, skew):
+    """Накопленные веса 1/rank^skew: немногие популярны, большинство — нет."""
+    return list(accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочных замеров: '
+        'пользователей, рецепты, избранное, корзины и подписки '
+        'с неравномерным (zipf) распределением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=4,
+            help='Среднее число рецептов в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=8,
+            help='Среднее число подписок у пользователя'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель zipf для авторов и популярности рецептов'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Сначала удалить ранее сгенерированных пользователей'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.skew = options['skew']
+        self.counts = {}
+        bench_users = User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}')
+        if options['flush']:
+            bench_users.delete()
+        if not Ingredient.objects.exists():
+            call_command('import_ingredients', stdout=StringIO())
+        self.ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+        with transaction.atomic():
+            users = self.create_users(options['users'], bench_users.count())
+            recipes = self.create_recipes(users, options['recipes'])
+            self.create_relations(
+                Favorite, 'recipe', users, recipes, options['favorites']
+            )
+            self.create_relations(
+                ShoppingCart, 'recipe', users, recipes, options['carts']
+            )
+            self.create_relations(
+                Subscription, 'author', users, users, options['subscriptions']
+            )
+            # bulk_create не вызывает сигналы: счётчики и суммы корзин
+            # пересчитываются целиком, как после ручной правки данных.
+            reconcile(apply=True)
+            call_command('rebuild_shopping_lists', stdout=StringIO())
+        bump_recipes_version()
+        recipe_ids.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, рецептов {len(recipes)}, '
+            f'в избранном {self.counts[Favorite]}, '
+            f'в корзинах {self.counts[ShoppingCart]}, '
+            f'подписок {self.counts[Subscription]}. '
+            f'Пароль пользователей: {BENCH_PASSWORD}.'
+        ))
+
+    def create_users(self, count, offset):
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@{BENCH_DOMAIN}',
+                    username=f'bench{number}',
+                    first_name='Bench', last_name=str(number),
+                    password=password,
+                )
+                for number in range(offset, offset + count)
+            ),
+            batch_size=self.chunk_size
+        )
+        return [user.id for user in users]
+
+    def create_recipes(self, author_ids, count):
+        if not author_ids:
+            return []
+        authors = self.random.choices(
+            author_ids, cum_weights=zipf_weights(len(author_ids), self.skew),
+            k=count
+        )
+        names = dict(Ingredient.objects.values_list('id', 'name'))
+        now = timezone.now()
+        recipes, ingredients, dates = [], [], []
+        for number, author_id in enumerate(authors):
+            chosen = self.random.sample(
+                self.ingredient_ids,
+                min(self.random.randint(3, 10), len(self.ingredient_ids))
+            )
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=f'{names[chosen[0]].capitalize()} с '
+                     f'{names[chosen[1]]} №{number}',
+                text=' '.join(names[pk] for pk in chosen),
+                cooking_time=self.random.randint(5, 180),
+            ))
+            ingredients.append(chosen)
+            dates.append(now - timedelta(
+                minutes=self.random.randint(0, 365 * 24 * 60)
+            ))
+        recipes = Recipe.objects.bulk_create(recipes, batch_size=self.chunk_size)
+        for recipe, pub_date in zip(recipes, dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(recipes, ['pub_date'], batch_size=self.chunk_size)
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe.id, ingredient_id=pk,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe, chosen in zip(recipes, ingredients)
+                for pk in chosen
+            ),
+            batch_size=self.chunk_size
+        )
+        return [recipe.id for recipe in recipes]
+
+    def create_relations(self, model, fk, user_ids, target_ids, mean):
+        if not target_ids:
+            self.counts[model] = 0
+            return
+        # Популярность целей не совпадает с порядком id: перемешиваем ранги.
+        ranked = self.random.sample(target_ids, len(target_ids))
+        weights = zipf_weights(len(ranked), self.skew)
+        rows = []
+        for user_id in user_ids:
+            wanted = min(
+                int(self.random.expovariate(1 / mean)) if mean else 0,
+                len(ranked)
+            )
+            targets = set(self.random.choices(ranked, cum_weights=weights, k=wanted))
+            if model is Subscription:
+                targets.discard(user_id)
+            rows.extend(
+                model(user_id=user_id, **{f'{fk}_id': target})
+                for target in targets
+            )
+        model.objects.bulk_create(
+            rows, batch_size=self.chunk_size, ignore_conflicts=True
+        )
+        self.counts[model] = len(rows)
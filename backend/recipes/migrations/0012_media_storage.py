@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:12
+
+import foodgram.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Картинка рецепта', null=True, storage=foodgram.storage.get_media_storage, upload_to='recipes/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+# Миграция не импортирует код приложения: SQL и выражение индекса
+# зафиксированы здесь и не меняются вместе с recipes.search.
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def fold(column):
+    # unicode61 не снимает диакритику с кириллицы: ё индексируется как е.
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+SQLITE_FORWARD = (
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text,
+        content='recipes_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, {fold('new.name')}, {fold('new.text')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, {fold('old.name')}, {fold('old.text')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, {fold('old.name')}, {fold('old.text')});
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, {fold('new.name')}, {fold('new.text')});
+    END
+    ''',
+    f'''
+    INSERT INTO {FTS_TABLE}(rowid, name, text)
+    SELECT id, {fold('name')}, {fold('text')} FROM recipes_recipe
+    ''',
+)
+
+SQLITE_BACKWARD = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+PG_INDEX_NAME = 'recipe_search_gin'
+
+
+def pg_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(
+        SearchVector('name', 'text', config='russian'), name=PG_INDEX_NAME
+    )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('recipes', 'Recipe'), pg_index())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_BACKWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('recipes', 'Recipe'), pg_index()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_media_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
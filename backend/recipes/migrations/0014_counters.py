@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'shopping_cart_count', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'User', 'subscribers_count', 'Subscription', 'author'),
+    ('users', 'User', 'subscriptions_count', 'Subscription', 'user'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app_label, model_name, field, related_name, fk in COUNTERS:
+        related = apps.get_model('recipes', related_name)
+        apps.get_model(app_label, model_name).objects.update(**{
+            field: Coalesce(Subquery(
+                related.objects.filter(**{fk: OuterRef('pk')}).order_by()
+                .values(fk).annotate(total=Count('*')).values('total')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search'),
+        ('users', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_name_prefix_idx'
+
+# name__istartswith: PostgreSQL сравнивает UPPER("name"::text) через LIKE,
+# для него нужен text_pattern_ops (индекс работает при любой локали);
+# в SQLite LIKE регистронезависим и использует индекс с COLLATE NOCASE.
+CREATE_SQL = {
+    'postgresql': (
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        '(UPPER(name::text) text_pattern_ops)'
+    ),
+    'sqlite': (
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        '(name COLLATE NOCASE)'
+    ),
+}
+DROP_SQL = f'DROP INDEX IF EXISTS {INDEX_NAME}'
+
+
+def create_prefix_index(apps, schema_editor):
+    sql = CREATE_SQL.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
+from foodgram.storage import get_media_storage
 from users.models import User
 
 MIN_COOKING_TIME = 1
@@ -36,6 +38,55 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов с флагами пользователя и связанными объектами."""
+
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited и is_in_shopping_cart через Exists."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """
+        Последние limit рецептов каждого автора одним запросом
+        (ROW_NUMBER() OVER (PARTITION BY author_id)).
+        """
+        queryset = self.filter(author_id__in=author_ids).order_by(
+            'author_id', '-pub_date', '-id'
+        )
+        if limit is None:
+            return queryset
+        return queryset.annotate(row_number=models.Window(
+            RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=(models.F('pub_date').desc(), models.F('id').desc()),
+        )).filter(row_number__lte=limit)
+
+    def with_related(self, user):
+        """Подгружает автора и ингредиенты фиксированным числом запросов."""
+        return self.prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=User.objects.with_subscription_flag(user)
+            ),
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
@@ -52,6 +103,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=get_media_storage,
         null=True,
         blank=True,
         verbose_name='Изображение',
@@ -77,6 +129,22 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -88,6 +156,21 @@ class Recipe(models.Model):
                 name='unique_author_recipe'
             )
         ]
+        indexes = [
+            # Лента и курсорная пагинация (-pub_date, -id).
+            models.Index(
+                fields=('pub_date', 'id'), name='recipe_pub_date_id_idx'
+            ),
+            # Рецепты автора: фильтр author и подписки с recipes_limit.
+            models.Index(
+                fields=('author', 'pub_date'), name='recipe_author_pub_date_idx'
+            ),
+            # Покрывающий индекс для ETag ленты: COUNT и MAX(updated_at)
+            # с join авторов читаются без прохода по таблице.
+            models.Index(
+                fields=('author', 'updated_at'), name='recipe_author_updated_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -118,6 +201,12 @@ class RecipeIngredient(models.Model):
                 name='unique_ingredient_in_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='recipeingredient_reverse_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient} - {self.amount}'
@@ -142,6 +231,12 @@ class UserRecipeRelation(models.Model):
                 name='%(class)s_unique'
             )
         ]
+        indexes = [
+            # Обратный поиск: кто добавил рецепт, EXISTS по рецептам ленты.
+            models.Index(
+                fields=('recipe', 'user'), name='%(class)s_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} -> {self.recipe}'
@@ -173,6 +268,39 @@ class ShoppingCart(UserRecipeRelation):
         verbose_name_plural = 'Корзина'
 
 
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в корзине пользователя.
+
+    Поддерживается инкрементально (см. recipes.cart_totals), чтобы выгрузка
+    списка покупок не пересчитывала SUM по RecipeIngredient и ShoppingCart.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    amount = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User,
@@ -192,6 +320,11 @@ class Subscription(models.Model):
                 name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('author', 'user'), name='subscription_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
@@ -0,0 +1,33 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этого порога оценка не используется — считаем точно.
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки без COUNT(*) по большой нефильтрованной таблице.
+
+    В PostgreSQL для списка без фильтров берёт оценку числа строк из
+    pg_class.reltuples; если таблица небольшая или список отфильтрован,
+    считает как обычно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE relname = %s',
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= ESTIMATE_THRESHOLD:
+                    return int(row[0])
+        return super().count
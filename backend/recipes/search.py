@@ -0,0 +1,159 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+Бэкенд выбирается по СУБД: FTS5 для SQLite, tsvector + GIN для PostgreSQL,
+для остальных — поиск через icontains. Индексы создаёт миграция
+0013_recipe_search; FTS5-таблицу синхронизируют триггеры SQLite, а
+GIN-индекс по выражению PostgreSQL обновляет сам при save/delete.
+
+SQLite теряет триггеры, когда миграция пересоздаёт таблицу рецептов,
+поэтому после каждого migrate они ставятся заново (install_sqlite_fts).
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+WORD_RE = re.compile(r'\w+')
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+
+
+def _fold(column):
+    # unicode61 не снимает диакритику с кириллицы: ё индексируется как е.
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+# Те же триггеры, что создаёт миграция 0013_recipe_search.
+SQLITE_FTS_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, {_fold('new.name')}, {_fold('new.text')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, {_fold('old.name')}, {_fold('old.text')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, {_fold('old.name')}, {_fold('old.text')});
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, {_fold('new.name')}, {_fold('new.text')});
+    END
+    ''',
+)
+
+
+def install_sqlite_fts(connection):
+    """Ставит триггеры синхронизации FTS5, если таблица уже создана."""
+    with connection.cursor() as cursor:
+        if FTS_TABLE not in connection.introspection.table_names(cursor):
+            return
+        for statement in SQLITE_FTS_TRIGGERS:
+            cursor.execute(statement)
+
+
+def tokenize(query):
+    return WORD_RE.findall(query.lower().replace('ё', 'е'))
+
+
+class SearchBackend:
+    """Базовый бэкенд: подстрочный поиск без индекса."""
+
+    def filter(self, queryset, query):
+        """Оставляет в queryset только рецепты, подходящие под запрос."""
+        condition = Q()
+        for token in tokenize(query):
+            condition &= Q(name__icontains=token) | Q(text__icontains=token)
+        return queryset.filter(condition)
+
+    def rank(self, query):
+        """Выражение релевантности: чем больше, тем выше в выдаче."""
+        return Value(0.0, output_field=FloatField())
+
+    def search(self, queryset, query):
+        if not tokenize(query):
+            return queryset.none()
+        return self.filter(queryset, query).annotate(
+            search_rank=self.rank(query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 с ранжированием по bm25."""
+
+    def match(self, query):
+        # Каждое слово — префиксный терм в кавычках, между ними AND.
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def filter(self, queryset, query):
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (self.match(query),)
+        ))
+
+    def rank(self, query):
+        # bm25 отрицателен и тем меньше, чем лучше совпадение.
+        return RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id',
+            (self.match(query),), output_field=FloatField()
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector по названию и описанию с GIN-индексом по тому же выражению."""
+
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('name', 'text', config=SEARCH_CONFIG)
+
+    def search_query(self, query):
+        from django.contrib.postgres.search import SearchQuery
+        return SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokenize(query)),
+            config=SEARCH_CONFIG, search_type='raw'
+        )
+
+    def filter(self, queryset, query):
+        return queryset.annotate(search_vector=self.vector()).filter(
+            search_vector=self.search_query(query)
+        )
+
+    def rank(self, query):
+        from django.contrib.postgres.search import SearchRank
+        return SearchRank(F('search_vector'), self.search_query(query))
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """Бэкенд из settings.RECIPE_SEARCH_BACKEND или по СУБД соединения."""
+    path = getattr(settings, 'RECIPE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    vendor = connections[using].vendor
+    return VENDOR_BACKENDS.get(vendor, SearchBackend)()
+
+
+def search_recipes(queryset, query):
+    """Рецепты из queryset, подходящие под запрос, по убыванию релевантности."""
+    return get_search_backend(queryset.db).search(queryset, query)
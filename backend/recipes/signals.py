@@ -0,0 +1,99 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from PIL import UnidentifiedImageError
+
+from recipes.cart_totals import add_recipe_to_cart, remove_recipe_from_cart
+from recipes.counters import change_counter, counters_for
+from recipes.images import generate_variants
+from recipes.ingredient_index import ingredient_index
+from recipes.search import install_sqlite_fts
+from recipes.short_links import recipe_ids
+from recipes.models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, Subscription
+)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасывает индекс автодополнения при изменении ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    """Название ингредиента входит в ответ рецепта — сдвигает updated_at."""
+    if not created:
+        Recipe.objects.filter(recipe_ingredients__ingredient=instance).update(
+            updated_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_id(sender, instance, created, **kwargs):
+    """Добавляет рецепт в карту коротких ссылок после коммита."""
+    if created:
+        transaction.on_commit(lambda: recipe_ids.add(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_ids(sender, **kwargs):
+    recipe_ids.invalidate()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в суммы корзины."""
+    if created:
+        add_recipe_to_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты рецепта из сумм корзины. pre_delete отправляется
+    до каскадного удаления, поэтому RecipeIngredient ещё на месте.
+    """
+    remove_recipe_from_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(sender, instance, **kwargs):
+    """Создаёт миниатюры и WebP при загрузке картинки рецепта."""
+    if not instance.image:
+        return
+    try:
+        generate_variants(instance.image)
+    except (OSError, UnidentifiedImageError):
+        # Варианты будут созданы лениво при первом запросе.
+        pass
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counters(sender, instance, created, **kwargs):
+    """Увеличивает денормализованные счётчики при создании связи."""
+    if created:
+        for model, field, fk in counters_for(sender):
+            change_counter(model, getattr(instance, f'{fk}_id'), field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counters(sender, instance, **kwargs):
+    """Уменьшает денормализованные счётчики при удалении связи."""
+    for model, field, fk in counters_for(sender):
+        change_counter(model, getattr(instance, f'{fk}_id'), field, -1)
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Возвращает триггеры FTS5, если миграция пересоздала таблицу рецептов."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        install_sqlite_fts(connection)
@@ -0,0 +1,127 @@
+"""
+Потоковое чтение записей из CSV, JSON-массива и NDJSON.
+
+Все читатели — генераторы поверх текстового потока: в памяти держится
+только текущая запись (и небольшой буфер для JSON-массива).
+"""
+import csv
+import json
+from itertools import islice
+
+FORMATS = ('csv', 'json', 'ndjson')
+BUFFER_SIZE = 64 * 1024
+_decoder = json.JSONDecoder()
+
+
+def read_csv(stream):
+    """Строки CSV с заголовком как словари."""
+    yield from csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    """По одному JSON-объекту на строку; пустые строки пропускаются."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json_array(stream):
+    """Элементы JSON-массива верхнего уровня без загрузки файла целиком."""
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer.startswith('['):
+                if buffer or eof:
+                    raise ValueError('Ожидался JSON-массив.')
+            else:
+                buffer = buffer[1:]
+                started = True
+                continue
+        else:
+            if buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith(']'):
+                return
+            if buffer:
+                try:
+                    item, end = _decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # Значение в самом конце буфера может быть обрезано
+                    # (число 12 из 123) — тогда дочитываем и разбираем снова.
+                    if end < len(buffer) or eof:
+                        yield item
+                        buffer = buffer[end:]
+                        continue
+            elif eof:
+                raise ValueError('JSON-массив не закрыт.')
+        chunk = stream.read(BUFFER_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json_array,
+    'ndjson': read_ndjson,
+}
+
+
+def detect_format(name, head):
+    """Формат по расширению, а для stdin — по первому значащему символу."""
+    for fmt in FORMATS:
+        if name.endswith(f'.{fmt}'):
+            return fmt
+    if name.endswith('.jsonl'):
+        return 'ndjson'
+    head = head.lstrip()
+    if head.startswith('['):
+        return 'json'
+    if head.startswith('{'):
+        return 'ndjson'
+    return 'csv'
+
+
+class _Unread:
+    """Поток, в начало которого возвращена уже прочитанная строка."""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.head:
+            head, self.head = self.head, ''
+            return head
+        return self.stream.read(size)
+
+    def __iter__(self):
+        if self.head:
+            head, self.head = self.head, ''
+            yield head
+        yield from self.stream
+
+
+def peek_line(stream):
+    """Первая строка потока и поток, из которого она снова будет прочитана."""
+    head = stream.readline()
+    return head, _Unread(head, stream)
+
+
+def read_records(stream, fmt):
+    return READERS[fmt](stream)
+
+
+def chunked(iterable, size):
+    """Разбивает итератор на списки по size элементов."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -1,3 +1,898 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.shopping_list import ingredient_totals
+from foodgram.storage import media_storage
+from recipes.counters import reconcile
+from recipes.images import VARIANTS, variant_name
+from recipes.ingredient_index import ingredient_index
+from recipes.management.commands.check_query_plans import full_scans
+from recipes.short_links import (
+    VERSION_CACHE_KEY, decode, encode, recipe_ids
+)
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Subscription
+)
+from users.models import User
+
+
+class ImportIngredientsTests(TestCase):
+    """Потоковый импорт ингредиентов порциями."""
+
+    def run_import(self, data, *args):
+        out = StringIO()
+        call_command(
+            'import_ingredients', '-', *args, stdin=StringIO(data), stdout=out
+        )
+        return out.getvalue()
+
+    def catalog(self):
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_formats(self):
+        self.run_import('name,measurement_unit\nсоль,г\nмука, кг \n')
+        self.run_import(
+            '[{"name": "сахар", "measurement_unit": "г"},\n'
+            ' {"name": "соль", "measurement_unit": "г"}]'
+        )
+        self.run_import(
+            '{"name": "молоко", "measurement_unit": "мл"}\n\n'
+            '{"name": "сахар", "measurement_unit": "г"}\n'
+        )
+        self.assertEqual(self.catalog(), {
+            ('соль', 'г'), ('мука', 'кг'), ('сахар', 'г'), ('молоко', 'мл')
+        })
+
+    def test_chunks_upsert_and_skips(self):
+        Ingredient.objects.create(name='ингредиент 3', measurement_unit='г')
+        rows = ''.join(
+            f'{{"name": "ингредиент {i}", "measurement_unit": "г"}}\n'
+            for i in range(7)
+        ) + '{"name": ""}\n'
+        out = self.run_import(rows, '--chunk-size', '3', '--format', 'ndjson')
+        self.assertEqual(Ingredient.objects.count(), 7)
+        self.assertIn('добавлено 6', out)
+        self.assertIn('пропущено некорректных: 1', out)
+
+    def test_invalidates_index(self):
+        self.assertEqual(ingredient_index.search('кориа'), [])
+        self.run_import('name,measurement_unit\nкориандр,г\n')
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.search('кориа')],
+            ['кориандр']
+        )
+
+    def test_default_catalog(self):
+        call_command('import_ingredients', stdout=StringIO())
+        self.assertGreater(Ingredient.objects.count(), 2000)
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self.run_import('[{"name": "соль"', '--format', 'json')
+        with self.assertRaises(CommandError):
+            call_command('import_ingredients', '/nonexistent.csv')
+
+
+class IngredientIndexTests(TestCase):
+    """Индекс автодополнения ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name='абрикос', measurement_unit='г'),
+            Ingredient(name='абрикосовый сок', measurement_unit='мл'),
+            Ingredient(name='авокадо', measurement_unit='шт'),
+            Ingredient(name='Базилик', measurement_unit='г'),
+        ])
+
+    def setUp(self):
+        ingredient_index.invalidate()
+
+    def names(self, prefix):
+        return [row['name'] for row in ingredient_index.search(prefix)]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names('абр'), ['абрикос', 'абрикосовый сок'])
+        self.assertEqual(self.names('АВ'), ['авокадо'])
+        self.assertEqual(self.names('баз'), ['Базилик'])
+        self.assertEqual(self.names('я'), [])
+        self.assertEqual(len(self.names('')), 4)
+
+    def test_invalidated_by_signals(self):
+        self.names('а')
+        ingredient = Ingredient.objects.create(name='айва', measurement_unit='г')
+        self.assertIn('айва', self.names('ай'))
+        ingredient.delete()
+        self.assertEqual(self.names('ай'), [])
+
+    def test_invalidate_during_lookup(self):
+        build = ingredient_index._ensure_built
+
+        def racing(*args):
+            # Сброс из другого потока сразу после сборки индекса.
+            snapshot = build(*args)
+            ingredient_index.invalidate()
+            return snapshot
+
+        with mock.patch.object(ingredient_index, '_ensure_built', racing):
+            self.assertEqual(self.names('абр'), ['абрикос', 'абрикосовый сок'])
+            self.assertTrue(ingredient_index.fingerprint())
+
+    def test_endpoint_served_without_db(self):
+        client = APIClient()
+        client.get('/api/ingredients/?name=а')
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/ingredients/?name=абрикос')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(
+            [row['name'] for row in response.json()],
+            ['абрикос', 'абрикосовый сок']
+        )
+
+
+class ShoppingListTotalsTests(TestCase):
+    """Инкрементальные суммы ингредиентов в корзинах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@example.com', username='buyer',
+            first_name='Buyer', last_name='Test', password='pass12345'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        cls.eggs = Ingredient.objects.create(name='яйца', measurement_unit='шт')
+        cls.recipes = []
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'омлет {i}', text='текст', cooking_time=5
+            )
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.salt, amount=2)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.milk, amount=50)
+            cls.recipes.append(recipe)
+
+    def totals(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient__name', 'amount'
+            )
+        )
+
+    def assert_consistent(self):
+        call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+    def test_add_and_remove_cart_rows(self):
+        first, second = self.recipes
+        ShoppingCart.objects.create(user=self.user, recipe=first)
+        ShoppingCart.objects.create(user=self.user, recipe=second)
+        self.assertEqual(self.totals(), {'соль': 4, 'молоко': 100})
+        ShoppingCart.objects.filter(user=self.user, recipe=first).delete()
+        self.assertEqual(self.totals(), {'соль': 2, 'молоко': 50})
+        second.delete()
+        self.assertEqual(self.totals(), {})
+        self.assert_consistent()
+
+    def test_recipe_update_through_api(self):
+        recipe = self.recipes[0]
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [
+                {'id': self.salt.id, 'amount': 3},
+                {'id': self.eggs.id, 'amount': 2},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.totals(), {'соль': 3, 'яйца': 2})
+        self.assert_consistent()
+
+        summary = client.get('/api/recipes/shopping_cart/').json()
+        self.assertEqual(summary['recipes_count'], 1)
+        self.assertEqual(
+            [item['name'] for item in summary['ingredients']], ['соль', 'яйца']
+        )
+
+    def test_recipe_update_applies_ingredient_diff(self):
+        recipe = self.recipes[0]
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        rows = dict(recipe.recipe_ingredients.values_list('ingredient', 'id'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'name': 'новый омлет', 'ingredients': [
+                    {'id': self.milk.id, 'amount': 50},
+                    {'id': self.salt.id, 'amount': 2},
+                ]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        writes = [
+            query['sql'] for query in ctx.captured_queries
+            if 'recipes_recipeingredient' in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(writes, [])
+
+        response = client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [
+                {'id': self.salt.id, 'amount': 5},
+                {'id': self.eggs.id, 'amount': 2},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        current = dict(recipe.recipe_ingredients.values_list('ingredient', 'id'))
+        self.assertEqual(current[self.salt.id], rows[self.salt.id])
+        self.assertNotIn(self.milk.id, current)
+        self.assertEqual(self.totals(), {'соль': 5, 'яйца': 2})
+        self.assert_consistent()
+
+    def test_rebuild_repairs_drift(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingListItem.objects.filter(user=self.user).update(amount=999)
+        with self.assertRaises(CommandError):
+            self.assert_consistent()
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.totals(), {'соль': 2, 'молоко': 50})
+
+
+def make_png(size=(1200, 800), color=(200, 80, 40)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageVariantTests(TestCase):
+    """Миниатюры и WebP-варианты картинок рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='photo@example.com', username='photo',
+            first_name='Photo', last_name='Test', password='pass12345'
+        )
+        cls.ingredient = Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        image = base64.b64encode(make_png()).decode()
+        response = self.client.post('/api/recipes/', {
+            'name': 'пирог', 'text': 'текст', 'cooking_time': 30,
+            'image': f'data:image/png;base64,{image}',
+            'ingredients': [{'id': self.ingredient.id, 'amount': 200}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.recipe = Recipe.objects.get(id=response.json()['id'])
+
+    def test_variants_created_on_upload(self):
+        storage = self.recipe.image.storage
+        for variant in VARIANTS:
+            name = variant_name(self.recipe.image.name, variant)
+            self.assertTrue(storage.exists(name), name)
+        name = variant_name(self.recipe.image.name, 'thumbnail')
+        with storage.open(name) as thumbnail:
+            self.assertEqual(max(Image.open(thumbnail).size), 480)
+
+    def test_serializers_pick_variant(self):
+        detail = self.client.get(f'/api/recipes/{self.recipe.id}/').json()
+        self.assertTrue(detail['image'].endswith(self.recipe.image.name))
+        feed = self.client.get('/api/recipes/').json()
+        self.assertTrue(feed['results'][0]['image'].endswith('.thumbnail.jpg'))
+        webp = self.client.get(
+            f'/api/recipes/{self.recipe.id}/?image_size=webp'
+        ).json()
+        self.assertTrue(webp['image'].endswith('.webp.webp'))
+
+    def test_lazy_generation_and_backfill(self):
+        storage = self.recipe.image.storage
+        name = variant_name(self.recipe.image.name, 'thumbnail_webp')
+        storage.delete(name)
+        self.client.get(f'/api/recipes/{self.recipe.id}/?image_size=thumbnail_webp')
+        self.assertTrue(storage.exists(name))
+
+        storage.delete(name)
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertTrue(storage.exists(name))
+        self.assertIn('Создано вариантов: 1', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+    """Хранение картинок по хешу содержимого и сборка мусора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='dedup@example.com', username='dedup',
+            first_name='Dedup', last_name='Test', password='pass12345'
+        )
+        cls.ingredient = Ingredient.objects.create(name='сахар', measurement_unit='г')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, name, color=(10, 20, 30)):
+        image = base64.b64encode(make_png((64, 64), color)).decode()
+        return {
+            'name': name, 'text': 'текст', 'cooking_time': 5,
+            'image': f'data:image/png;base64,{image}',
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+        }
+
+    def files(self):
+        return set(media_storage.listdir('recipes')[1])
+
+    def test_same_content_stored_once(self):
+        first = self.client.post('/api/recipes/', self.payload('первый'), format='json')
+        files = self.files()
+        second = self.client.post('/api/recipes/', self.payload('второй'), format='json')
+        self.assertEqual(self.files(), files)
+        first_recipe = Recipe.objects.get(id=first.json()['id'])
+        second_recipe = Recipe.objects.get(id=second.json()['id'])
+        self.assertEqual(first_recipe.image.name, second_recipe.image.name)
+        self.assertEqual(
+            first_recipe.image.name,
+            'recipes/' + hashlib.sha256(make_png((64, 64), (10, 20, 30))).hexdigest() + '.png'
+        )
+
+    def test_reupload_restarts_gc_grace_period(self):
+        content = ContentFile(make_png((8, 8), (1, 2, 3)), name='blob.png')
+        name = media_storage.save('recipes/blob.png', content)
+        day_ago = time.time() - 24 * 60 * 60
+        os.utime(media_storage.path(name), (day_ago, day_ago))
+        # Ту же картинку загружают снова, а рецепт ещё не сохранён в БД.
+        self.assertEqual(media_storage.save('recipes/blob.png', content), name)
+        call_command('gc_media', '--min-age=1', stdout=StringIO())
+        self.assertTrue(media_storage.exists(name))
+
+    def test_gc_removes_unreferenced_blobs(self):
+        response = self.client.post('/api/recipes/', self.payload('старый'), format='json')
+        recipe_id = response.json()['id']
+        old_name = Recipe.objects.get(id=recipe_id).image.name
+        self.client.patch(
+            f'/api/recipes/{recipe_id}/',
+            self.payload('старый', color=(90, 90, 90)), format='json'
+        )
+        new_name = Recipe.objects.get(id=recipe_id).image.name
+        self.assertNotEqual(old_name, new_name)
+
+        call_command('gc_media', '--min-age=0', stdout=StringIO())
+        self.assertFalse(media_storage.exists(old_name))
+        self.assertFalse(media_storage.exists(variant_name(old_name, 'webp')))
+        self.assertTrue(media_storage.exists(new_name))
+        self.assertTrue(media_storage.exists(variant_name(new_name, 'webp')))
+
+
+class RecipeSearchTests(TestCase):
+    """Полнотекстовый поиск рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='search@example.com', username='search',
+            first_name='Search', last_name='Test', password='pass12345',
+            is_staff=True, is_superuser=True
+        )
+        cls.borscht = Recipe.objects.create(
+            author=cls.user, name='Борщ', text='Свёкла, капуста. Борщ варить час.',
+            cooking_time=90
+        )
+        cls.salad = Recipe.objects.create(
+            author=cls.user, name='Салат', text='Свекла и чеснок',
+            cooking_time=10
+        )
+        cls.pie = Recipe.objects.create(
+            author=cls.user, name='Пирог', text='Яблоки и тесто', cooking_time=60
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()['results']]
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search('борщ'), ['Борщ'])
+        self.assertEqual(self.search('свек'), ['Салат', 'Борщ'])
+        self.assertEqual(self.search('свекла чеснок'), ['Салат'])
+        self.assertEqual(self.search('тесто'), ['Пирог'])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_save_and_delete(self):
+        self.pie.name = 'Шарлотка'
+        self.pie.save()
+        self.assertEqual(self.search('шарлот'), ['Шарлотка'])
+        self.assertEqual(self.search('пирог'), [])
+        self.pie.delete()
+        self.assertEqual(self.search('шарлот'), [])
+
+    def test_admin_uses_index(self):
+        model_admin = admin.site._registry[Recipe]
+        queryset, _ = model_admin.get_search_results(
+            None, Recipe.objects.all(), 'яблок'
+        )
+        self.assertEqual(list(queryset), [self.pie])
+        queryset, _ = model_admin.get_search_results(
+            None, Recipe.objects.all(), 'SEAR'
+        )
+        self.assertEqual(queryset.count(), 3)
+
+
+class CounterTests(TestCase):
+    """Денормализованные счётчики на Recipe и User."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='counted@example.com', username='counted',
+            first_name='Counted', last_name='Author', password='pass12345'
+        )
+        cls.fan = User.objects.create_user(
+            email='fan@example.com', username='fan',
+            first_name='Fan', last_name='Reader', password='pass12345'
+        )
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_counters_follow_relations(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='каша', text='текст', cooking_time=5
+        )
+        Favorite.objects.create(user=self.fan, recipe=recipe)
+        ShoppingCart.objects.create(user=self.fan, recipe=recipe)
+        Subscription.objects.create(user=self.fan, author=self.author)
+        self.refresh(recipe, self.author, self.fan)
+        self.assertEqual((recipe.favorites_count, recipe.shopping_cart_count), (1, 1))
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.fan.subscriptions_count, 1)
+
+        Favorite.objects.filter(user=self.fan).delete()
+        Subscription.objects.filter(user=self.fan).delete()
+        recipe.delete()
+        self.refresh(self.author, self.fan)
+        self.assertEqual(self.author.recipes_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
+        self.assertEqual(self.fan.subscriptions_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='суп', text='текст', cooking_time=5
+        )
+        Favorite.objects.create(user=self.fan, recipe=recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=7)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('Найдено расхождений: 2.', out.getvalue())
+        call_command('reconcile_counters', stdout=StringIO())
+        self.refresh(recipe, self.author)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+
+class AdminChangelistTests(TestCase):
+    """Число запросов списков админки не растёт вместе с таблицами."""
+
+    URLS = (
+        '/admin/recipes/recipe/',
+        '/admin/recipes/recipe/?cooking_time_range=range',
+        '/admin/recipes/ingredient/',
+        '/admin/recipes/ingredient/?has_recipes=yes',
+        '/admin/users/user/',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin',
+            first_name='Admin', last_name='Test', password='pass12345'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def grow(self, count):
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(
+                email=f'cook{i}@example.com', username=f'cook{i}',
+                first_name='Cook', last_name=str(i), password='pass12345'
+            )
+            ingredient = Ingredient.objects.create(
+                name=f'продукт {i}', measurement_unit='г'
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'блюдо {i}', text='текст', cooking_time=i + 1
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=i + 1
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_flat(self):
+        self.grow(4)
+        before = {url: self.count_queries(url) for url in self.URLS}
+        self.grow(8)
+        cache.clear()
+        after = {url: self.count_queries(url) for url in self.URLS}
+        self.assertEqual(before, after)
+
+    def test_users_are_not_listed(self):
+        self.grow(2)
+        User.objects.bulk_create(
+            User(email=f'idle{i}@example.com', username=f'idle{i}')
+            for i in range(5)
+        )
+        recipe = Recipe.objects.first()
+        for url in ('/admin/recipes/recipe/',
+                    f'/admin/recipes/recipe/{recipe.pk}/change/'):
+            self.assertNotContains(self.client.get(url), 'idle3')
+
+    def test_ingredient_search_by_substring_and_unit(self):
+        Ingredient.objects.create(name='сливочное масло', measurement_unit='г')
+        Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        model_admin = admin.site._registry[Ingredient]
+        for term, expected in (('масло', ['сливочное масло']),
+                               ('мл', ['молоко'])):
+            queryset, _ = model_admin.get_search_results(
+                None, Ingredient.objects.all(), term
+            )
+            self.assertEqual(
+                list(queryset.values_list('name', flat=True)), expected
+            )
+
+    def test_cooking_time_bounds_are_cached(self):
+        self.grow(6)
+        url = '/admin/recipes/recipe/'
+        first = self.count_queries(url)
+        self.assertLess(self.count_queries(url), first)
+        response = self.client.get(url)
+        self.assertContains(response, 'Меньше 2 мин (1)')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeDumpLoadTests(TestCase):
+    """Перенос рецептов командами dump_recipes и load_recipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='dump@example.com', username='dump',
+            first_name='Dump', last_name='Author', password='pass12345'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'выгрузка {i}',
+                text='текст', cooking_time=5 + i
+            )
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.salt, amount=i + 1)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=cls.milk, amount=100)
+        cls.image_name = media_storage.save(
+            'recipes/photo.png', ContentFile(make_png((50, 50)))
+        )
+        Recipe.objects.filter(name='выгрузка 0').update(image=cls.image_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def dump(self, *args):
+        out = StringIO()
+        call_command('dump_recipes', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def load(self, data, *args):
+        out = StringIO()
+        call_command(
+            'load_recipes', '-', '--chunk-size', '2', *args,
+            stdin=StringIO(data), stdout=out
+        )
+        return out.getvalue()
+
+    def snapshot(self):
+        return sorted(
+            (recipe.author.email, recipe.name, recipe.cooking_time,
+             recipe.pub_date, recipe.image.name or None,
+             sorted((item.ingredient.name, item.amount)
+                    for item in recipe.recipe_ingredients.all()))
+            for recipe in Recipe.objects.select_related('author')
+        )
+
+    def test_round_trip(self):
+        before = self.snapshot()
+        data = self.dump('--embed-images')
+        self.assertEqual(len(data.splitlines()), 3)
+        User.objects.filter(pk=self.author.pk).delete()
+        media_storage.delete(self.image_name)
+        Ingredient.objects.filter(pk=self.milk.pk).delete()
+
+        out = self.load(data, '--create-authors')
+        self.assertIn('Загружено 3 рецептов', out)
+        self.assertEqual(self.snapshot(), before)
+        self.assertTrue(media_storage.exists(self.image_name))
+        self.assertEqual(
+            User.objects.get(email=self.author.email).recipes_count, 3
+        )
+
+    def test_existing_and_unknown_authors_skipped(self):
+        data = self.dump()
+        self.assertIn('уже были: 3', self.load(data))
+        unknown = data.replace('dump@example.com', 'ghost@example.com')
+        self.assertIn('без автора: 3', self.load(unknown))
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_load_query_count_per_chunk(self):
+        data = self.dump()
+        Recipe.objects.all().delete()
+        with CaptureQueriesContext(connection) as small:
+            self.load('\n'.join(data.splitlines()[:2]))
+        Recipe.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.load(data)
+        # Три рецепта при порции 2 — две порции: число запросов растёт
+        # с числом порций, а не рецептов.
+        self.assertLessEqual(
+            len(large.captured_queries), 2 * len(small.captured_queries)
+        )
+
+
+class BenchmarkCommandsTests(TestCase):
+    """Генератор синтетических данных и прогон бенчмарка эндпоинтов."""
+
+    def test_seed_and_benchmark(self):
+        call_command(
+            'seed_bench_data', '--users', '20', '--recipes', '60',
+            stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 60)
+        self.assertTrue(Favorite.objects.exists())
+        self.assertTrue(Subscription.objects.exists())
+        self.assertEqual(set(reconcile(apply=False).values()), {0})
+
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        call_command(
+            'benchmark_api', '--iterations', '2', '--warmup', '0',
+            '--output', output.name, stdout=StringIO()
+        )
+        with open(output.name, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['meta']['rows']['recipes'], 60)
+        self.assertIn('recipes-list', report['results'])
+        for name, result in report['results'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_benchmark_single_user(self):
+        user = User.objects.create_user(
+            email='alone@example.com', username='alone',
+            first_name='Alone', last_name='User', password='pass12345'
+        )
+        recipe = Recipe.objects.create(
+            author=user, name='омлет', text='текст', cooking_time=5
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe, amount=2, ingredient=Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            )
+        )
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        out = StringIO()
+        with mock.patch(
+            'api.shopping_list.ingredient_totals', wraps=ingredient_totals
+        ) as totals:
+            call_command(
+                'benchmark_api', '--iterations', '1', '--warmup', '0',
+                '--output', output.name, stdout=out
+            )
+        # Выгрузка читает список покупок, только пока отдаёт тело ответа.
+        self.assertTrue(totals.called)
+        self.assertIn('favorite-toggle, shopping-cart-toggle', out.getvalue())
+        self.assertIn('subscribe-toggle', out.getvalue())
+        with open(output.name, encoding='utf-8') as file:
+            results = json.load(file)['results']
+        self.assertNotIn('subscribe-toggle', results)
+        self.assertEqual(results['download-shopping-cart']['errors'], 0)
+
+    def test_connection_benchmark(self):
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        # Соединения с тестовой БД в памяти SQLite не закрывает — берём файл.
+        database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(database))
+        with mock.patch.dict(connection.settings_dict, {'NAME': database}):
+            call_command(
+                'benchmark_connections', '--requests', '20',
+                '--output', output.name, stdout=StringIO()
+            )
+        with open(output.name, encoding='utf-8') as file:
+            results = json.load(file)['results']
+        self.assertEqual(results['per-request']['connections_opened'], 20)
+        self.assertEqual(results['persistent']['connections_opened'], 1)
+        self.assertNotIn('pool', results)
+
+    def test_query_plans_use_indexes(self):
+        call_command(
+            'seed_bench_data', '--users', '20', '--recipes', '60',
+            stdout=StringIO()
+        )
+        out = StringIO()
+        call_command('check_query_plans', '--min-rows', '50', stdout=out)
+        self.assertNotIn('полный проход', out.getvalue())
+
+        # SQL выгрузки выполняется при чтении потокового ответа.
+        out = StringIO()
+        call_command(
+            'check_query_plans', '--min-rows', '50', '--show-plans',
+            '--only', 'download-shopping-cart', stdout=out
+        )
+        self.assertIn('FROM "recipes_shoppinglistitem"', out.getvalue())
+
+        # Без индекса ленты рецепты сортируются полным проходом.
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX recipe_pub_date_id_idx')
+        with self.assertRaises(CommandError):
+            call_command(
+                'check_query_plans', '--min-rows', '50',
+                '--only', 'recipes-list-anon', stdout=StringIO()
+            )
+
+    def test_full_scan_detection(self):
+        _, scans = full_scans(
+            'SELECT * FROM "recipes_recipe" U0 WHERE U0."text" = \'x\''
+        )
+        self.assertEqual(scans, {'recipes_recipe'})
+        query = Ingredient.objects.filter(name__istartswith='мол')
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            sql = connection.ops.last_executed_query(cursor, sql, params)
+        self.assertEqual(full_scans(sql)[1], set())
+
+
+class ShortLinkTests(TestCase):
+    """Короткие ссылки: base62-коды и проверка id без запросов к БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='short@example.com', username='short',
+            first_name='Short', last_name='Link', password='pass12345'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='ссылка', text='текст', cooking_time=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        recipe_ids.invalidate()
+        self.client = APIClient()
+
+    def test_codes(self):
+        self.assertEqual(encode(0), '0')
+        self.assertEqual(encode(61), 'Z')
+        self.assertEqual(encode(62), '10')
+        for number in (1, 3843, 10 ** 12):
+            self.assertEqual(decode(encode(number)), number)
+
+    def test_get_link_and_redirect_without_queries(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/get-link/')
+        link = response.json()['short-link']
+        self.assertTrue(link.endswith(f'/s/{encode(self.recipe.id)}/'))
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{encode(self.recipe.id)}/')
+            self.client.get(f'/{self.recipe.id}/')
+        self.assertRedirects(
+            response, f'/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+
+    def test_missing_recipe(self):
+        self.assertEqual(self.client.get('/s/zzzz/').status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/recipes/999999/get-link/').status_code, 404
+        )
+
+    def test_map_follows_signals(self):
+        self.assertTrue(recipe_ids.contains(self.recipe.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name='новая', text='текст', cooking_time=5
+            )
+        with self.assertNumQueries(0):
+            self.assertTrue(recipe_ids.contains(recipe.id))
+        pk = recipe.id
+        recipe.delete()
+        self.assertFalse(recipe_ids.contains(pk))
+
+    def test_unknown_codes_without_queries(self):
+        self.assertTrue(recipe_ids.contains(self.recipe.id))
+        with self.assertNumQueries(0):
+            for pk in (self.recipe.id + 1, 10 ** 9, decode('zzzzzz')):
+                self.assertFalse(recipe_ids.contains(pk))
+            self.assertEqual(self.client.get('/s/zzzzzz/').status_code, 404)
+
+    def test_created_in_another_process(self):
+        self.assertTrue(recipe_ids.contains(self.recipe.id))
+        # Другой процесс: запись без сигналов этого процесса и сдвиг версии.
+        recipe, = Recipe.objects.bulk_create([Recipe(
+            author=self.author, name='из другого процесса', text='текст',
+            cooking_time=5
+        )])
+        cache.incr(VERSION_CACHE_KEY)
+        self.assertTrue(recipe_ids.contains(recipe.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(recipe_ids.contains(recipe.id))
+
+    def test_invalidate_during_lookup(self):
+        build = recipe_ids._ensure_built
+
+        def racing(version):
+            bits = build(version)
+            recipe_ids.invalidate()
+            return bits
+
+        with mock.patch.object(recipe_ids, '_ensure_built', racing):
+            self.assertTrue(recipe_ids.contains(self.recipe.id))
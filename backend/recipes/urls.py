@@ -1,8 +1,13 @@
-from django.urls import path
+from django.urls import path, register_converter
+
+from .short_links import ShortCodeConverter
 from .views import short_link_redirect_view
 
 app_name = 'recipes'
 
+register_converter(ShortCodeConverter, 'short')
+
 urlpatterns = [
-    path('<int:recipe_id>/', short_link_redirect_view, name='short-link-redirect'),
+    path('s/<short:recipe_id>/', short_link_redirect_view, name='short-link-redirect'),
+    path('<int:recipe_id>/', short_link_redirect_view, name='numeric-link-redirect'),
 ]
@@ -1,10 +1,22 @@
-from django.shortcuts import get_object_or_404, redirect
-from recipes.models import Recipe
+from django.http import Http404
+from django.shortcuts import redirect
+
+from recipes.short_links import recipe_ids
+
 
 def short_link_redirect_view(request, recipe_id):
     """
-    Обрабатывает короткую ссылку вида /s/3d<ID> и перенаправляет на полную.
+    Обрабатывает короткую ссылку вида /s/<base62-код> или /<ID>
+    и перенаправляет на полную. Существование рецепта проверяется
+    по карте id в памяти, без запроса к БД.
     """
+    if not recipe_ids.contains(recipe_id):
+        raise Http404
+    return redirect(f'/recipes/{recipe_id}/')
+
 
-    recipe = get_object_or_404(Recipe, id=recipe_id)
+async def ashort_link_redirect_view(request, recipe_id):
+    """Асинхронный вариант short_link_redirect_view для ASGI."""
+    if not await recipe_ids.acontains(recipe_id):
+        raise Http404
     return redirect(f'/recipes/{recipe_id}/')
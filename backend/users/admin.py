@@ -4,6 +4,7 @@ from django.utils.safestring import mark_safe
 from django.utils.html import format_html
 
 from recipes.models import Subscription
+from recipes.paginators import EstimatedCountPaginator
 from .models import User
 
 
@@ -15,7 +16,7 @@ class UserAdmin(BaseUserAdmin):
         'full_name',
         'email',
         'avatar_tag',
-        'recipe_count',
+        'recipes_count',
         'subscriptions_count',
         'subscribers_count',
     )
@@ -23,6 +24,8 @@ class UserAdmin(BaseUserAdmin):
     search_fields = ('email', 'username', 'first_name', 'last_name')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     ordering = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description='ФИО')
     def full_name(self, obj):
@@ -35,18 +38,6 @@ class UserAdmin(BaseUserAdmin):
             return format_html('<img src="{}" width="40" height="40" style="border-radius:50%;" />', obj.avatar.url)
         return "—"
 
-    @admin.display(description='Рецептов')
-    def recipe_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Подписок')
-    def subscriptions_count(self, obj):
-        return obj.subscriptions.count()  # ← через related_name
-
-    @admin.display(description='Подписчиков')
-    def subscribers_count(self, obj):
-        return obj.subscribers.count()  # ← через related_name
-
     fieldsets = (
         (None, {
             'fields': ('email', 'username', 'password')
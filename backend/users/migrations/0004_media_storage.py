@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:12
+
+import foodgram.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_managers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение профиля', null=True, storage=foodgram.storage.get_media_storage, upload_to='avatars/', verbose_name='Аватар'),
+        ),
+    ]
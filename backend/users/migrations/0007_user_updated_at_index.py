@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at'], name='user_updated_at_idx'),
+        ),
+    ]
@@ -1,7 +1,29 @@
-from django.contrib.auth.models import AbstractUser
+from django.apps import apps
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
 from django.db import models
 
+from foodgram.storage import get_media_storage
+
+
+class UserQuerySet(models.QuerySet):
+    """Запросы пользователей с флагом подписки."""
+
+    def with_subscription_flag(self, user):
+        """Аннотирует is_subscribed для текущего пользователя через Exists."""
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=models.Value(False))
+        subscription = apps.get_model('recipes', 'Subscription')
+        return self.annotate(is_subscribed=models.Exists(
+            subscription.objects.filter(
+                user=user, author=models.OuterRef('pk')
+            )
+        ))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     email = models.EmailField(
@@ -32,17 +54,43 @@ class User(AbstractUser):
     )
     avatar = models.ImageField(
         upload_to='avatars/',
+        storage=get_media_storage,
         blank=True,
         null=True,
         verbose_name='Аватар',
         help_text='Загрузите изображение профиля'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок'
+    )
+
+    objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
     class Meta:
         ordering = ['username']
+        indexes = [
+            # MAX(updated_at) для ETag списка пользователей.
+            models.Index(fields=['updated_at'], name='user_updated_at_idx'),
+        ]
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
 